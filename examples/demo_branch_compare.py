@@ -9,6 +9,7 @@ This demonstrates the killer use case: deterministic comparison of agent
 strategies from the exact same starting point.
 
 Usage:
+    pip install -e .
     export GOOGLE_API_KEY="your-key"
     python examples/demo_branch_compare.py
 """
@@ -16,24 +17,34 @@ Usage:
 import os
 import sys
 import time
+import asyncio
+from array import array
 import tempfile
-from pathlib import Path
-from collections import Counter
+from collections import defaultdict
 
-sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
-
-from core import AgentGit
-from tools.branch_tools import BranchTools
-from tools.version_tools import VersionTools
-from event import EventType
+from agentgit import AgentGit, EventType
+from agentgit.tools import BranchTools, VersionTools
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.graph import StateGraph, MessagesState, START, END
+from langgraph.checkpoint.memory import MemorySaver
 
 
 USER = "developer"
 SESSION = "code-task"
+# Each branch runs in its own session so the tracer attributes concurrent
+# events to the right branch.
+SESSION_A = f"{SESSION}-a"
+SESSION_B = f"{SESSION}-b"
 DIVIDER = "=" * 64
 
+# Comparison table layout: label column, then one column per branch
+LBL_W = 28
+COL_W = 20
+ROW_FMT = f"  {{:<{LBL_W}}} {{:>{COL_W}}} {{:>{COL_W}}}"
+RULE_ROW = ROW_FMT.format("_" * LBL_W, "_" * COL_W, "_" * COL_W)
+BREAKDOWN_FMT = f"    {{:<{LBL_W - 2}}} {{:>{COL_W}}} {{:>{COL_W}}}"
+BRANCH_FMT = "    {:<28} status={:<12} nodes={}"
+
 
 def main():
     if "GOOGLE_API_KEY" not in os.environ:
@@ -50,13 +61,14 @@ def main():
 
         bt.create_branch(USER, SESSION, "main", intent="Main execution")
 
-        # Track tokens across branches
-        token_tracker = {"a": 0, "b": 0}
+        # Buffer token usage per branch session (branches run concurrently);
+        # the buffers are summed once when the branches finish.
+        usage_bufs = {SESSION_A: array("q"), SESSION_B: array("q")}
 
         def track_tokens(event):
-            usage = getattr(event, "usage", None)
-            if usage and isinstance(usage, dict):
-                token_tracker["current"] = token_tracker.get("current", 0) + (usage.get("total_tokens") or 0)
+            buf = usage_bufs.get(event.session_id)
+            if buf is not None and event.usage:
+                buf.append(event.usage.get("total_tokens") or 0)
 
         ag.on(EventType.LLM_CALL_END, track_tokens)
 
@@ -70,30 +82,44 @@ def main():
         graph.add_node("agent", agent_node)
         graph.add_edge(START, "agent")
         graph.add_edge("agent", END)
-        app = graph.compile()
-
-        config = {
-            "callbacks": [callback],
-            "configurable": {"user_id": USER, "session_id": SESSION},
-            "metadata": {"user_id": USER, "session_id": SESSION},
-        }
-
-        conversation = []
-
-        def chat(message):
-            """Send a message and get agent response."""
-            ag.emit_user_input(USER, SESSION, message)
-            conversation.append(("human", message))
-            result = app.invoke({"messages": conversation}, config=config)
-            ai_msg = result["messages"][-1].content
-            conversation.append(("ai", ai_msg))
-            return ai_msg
+        # The checkpointer keeps each thread's message history, so every turn
+        # only sends the new message instead of replaying the conversation.
+        app = graph.compile(checkpointer=MemorySaver())
+
+        def make_config(session_id):
+            return {
+                "callbacks": [callback],
+                "configurable": {
+                    "user_id": USER,
+                    "session_id": session_id,
+                    "thread_id": f"{USER}:{session_id}",
+                },
+                "metadata": {"user_id": USER, "session_id": session_id},
+            }
+
+        def as_pairs(messages):
+            """Message history as JSON-friendly (role, text) pairs for checkpoints."""
+            return [(m.type, m.content) for m in messages]
+
+        async def achat(session_id, message):
+            """Send a message on a session's thread and stream back the agent response."""
+            ag.emit_user_input(USER, session_id, message)
+            parts = []
+            async for chunk, _ in app.astream(
+                {"messages": [("human", message)]},
+                config=make_config(session_id),
+                stream_mode="messages",
+            ):
+                parts.append(chunk.content)
+            return "".join(parts)
 
         def print_response(label, text, max_len=600):
             print(f"\n{label}")
             print("-" * 40)
-            trimmed = text[:max_len] + ("..." if len(text) > max_len else "")
-            print(trimmed)
+            if len(text) > max_len:
+                print(text[:max_len], "...", sep="")
+            else:
+                print(text)
 
         # ────────────────────────────────────────────────────────────
         # PHASE 1: Define the problem
@@ -102,14 +128,15 @@ def main():
         print("  PHASE 1: Define the problem")
         print(DIVIDER)
 
-        response = chat(
+        response = asyncio.run(achat(
+            SESSION,
             "I need a Python function called `find_anomalies` that takes a "
             "list of numerical sensor readings and identifies anomalous values. "
             "An anomaly is any reading that deviates more than 2 standard "
             "deviations from the mean. Return a list of (index, value) tuples. "
             "Just acknowledge the task and summarize your understanding. "
             "Do NOT write code yet."
-        )
+        ))
         print_response("Agent acknowledges:", response)
 
         # ────────────────────────────────────────────────────────────
@@ -119,17 +146,19 @@ def main():
         print("  CHECKPOINT: Saving state before implementation")
         print(DIVIDER)
 
+        # The thread's state at this point is what both branches fork from
+        checkpoint_state = app.get_state(make_config(SESSION)).values
+        saved_conversation = as_pairs(checkpoint_state.get("messages", []))
         checkpoint = ag.checkpoint(
             USER, SESSION, "pre-implementation",
             agent_memory={"task": "anomaly detection function"},
-            conversation_history=list(conversation),
+            conversation_history=saved_conversation,
             label="Before choosing approach",
         )
         checkpoint_node = ag.get_active_branch(USER, SESSION).head_node_id
-        saved_conversation = list(conversation)
 
         print(f"  Saved at node:        {checkpoint_node}")
-        print(f"  Conversation length:  {len(conversation)} messages")
+        print(f"  Conversation length:  {len(saved_conversation)} messages")
         print(f"  Checkpoint hash:      {checkpoint.hash[:12]}...")
         print(f"  Git SHA:              {checkpoint.filesystem_ref[:12]}...")
         print()
@@ -137,81 +166,78 @@ def main():
         print("  from this exact point.")
 
         # ────────────────────────────────────────────────────────────
-        # BRANCH A: Statistics-heavy approach
+        # FORK: Two branches from the checkpoint, run concurrently
         # ────────────────────────────────────────────────────────────
         print(f"\n{DIVIDER}")
-        print("  BRANCH A: Pure statistics approach (numpy/scipy)")
+        print("  FORK: Running both approaches concurrently")
         print(DIVIDER)
 
-        branch_a_id = bt.create_branch(
-            USER, SESSION, "approach-statistics",
-            from_node=int(checkpoint_node),
-            intent="Use numpy/scipy statistical methods",
-        )
-        token_tracker["current"] = 0
-        start_a = time.time()
-
-        response_a = chat(
-            "Write find_anomalies using numpy and scipy. "
-            "Use scipy.stats.zscore for z-score calculation. "
-            "Include proper imports, type hints, and a docstring. "
-            "Make it production-ready with edge case handling. "
-            "Show the complete implementation."
-        )
-        time_a = time.time() - start_a
-        token_tracker["a"] = token_tracker.get("current", 0)
+        # Both branch rows land in one commit before either agent starts
+        with ag.transaction():
+            branch_a_id = bt.create_branch(
+                USER, SESSION_A, "approach-statistics",
+                from_node=checkpoint_node,
+                intent="Use numpy/scipy statistical methods",
+            )
+            branch_b_id = bt.create_branch(
+                USER, SESSION_B, "approach-pure-python",
+                from_node=checkpoint_node,
+                intent="Use only Python stdlib, no external packages",
+            )
+
+        # Each branch gets its own thread seeded from the checkpointed thread
+        # state, so neither agent sees the other's work and no files are
+        # checked out just to restore the conversation.
+        app.update_state(make_config(SESSION_A), checkpoint_state)
+        app.update_state(make_config(SESSION_B), checkpoint_state)
+
+        print("  Branch A: Pure statistics approach (numpy/scipy)")
+        print("  Branch B: Pure Python approach (zero dependencies)")
+        print(f"  Both start from the same {len(saved_conversation)}-message conversation")
+
+        async def run_branch_a():
+            start = time.time()
+            response = await achat(
+                SESSION_A,
+                "Write find_anomalies using numpy and scipy. "
+                "Use scipy.stats.zscore for z-score calculation. "
+                "Include proper imports, type hints, and a docstring. "
+                "Make it production-ready with edge case handling. "
+                "Show the complete implementation."
+            )
+            return response, time.time() - start
+
+        async def run_branch_b():
+            start = time.time()
+            response = await achat(
+                SESSION_B,
+                "Write find_anomalies using ONLY Python standard library. "
+                "No numpy, no scipy, no pandas. Calculate mean and standard "
+                "deviation manually using math.sqrt and sum(). "
+                "Include proper type hints and a docstring. "
+                "Make it production-ready with edge case handling. "
+                "Show the complete implementation."
+            )
+            return response, time.time() - start
+
+        async def run_branches():
+            return await asyncio.gather(run_branch_a(), run_branch_b())
+
+        start_both = time.time()
+        (response_a, time_a), (response_b, time_b) = asyncio.run(run_branches())
+        time_both = time.time() - start_both
+        tokens_a = sum(usage_bufs[SESSION_A])
+        tokens_b = sum(usage_bufs[SESSION_B])
 
         print_response("Branch A result:", response_a)
-
-        stats_a = bt.get_branch_stats(USER, SESSION, "approach-statistics")
-        nodes_a = ag.get_branch_nodes(USER, SESSION, branch_a_id)
-
-        # ────────────────────────────────────────────────────────────
-        # RESTORE: Revert to checkpoint
-        # ────────────────────────────────────────────────────────────
-        print(f"\n{DIVIDER}")
-        print("  RESTORE: Reverting to checkpoint")
-        print(DIVIDER)
-
-        conversation.clear()
-        conversation.extend(saved_conversation)
-        ag.restore(checkpoint)
-
-        print(f"  Conversation reset to {len(conversation)} messages")
-        print(f"  Agent has NO memory of Branch A")
-        print(f"  Starting fresh from the same decision point")
-
-        # ────────────────────────────────────────────────────────────
-        # BRANCH B: Pure Python approach (no dependencies)
-        # ────────────────────────────────────────────────────────────
-        print(f"\n{DIVIDER}")
-        print("  BRANCH B: Pure Python approach (zero dependencies)")
-        print(DIVIDER)
-
-        bt.switch_branch(USER, SESSION, "main")
-        branch_b_id = bt.create_branch(
-            USER, SESSION, "approach-pure-python",
-            from_node=int(checkpoint_node),
-            intent="Use only Python stdlib, no external packages",
-        )
-        token_tracker["current"] = 0
-        start_b = time.time()
-
-        response_b = chat(
-            "Write find_anomalies using ONLY Python standard library. "
-            "No numpy, no scipy, no pandas. Calculate mean and standard "
-            "deviation manually using math.sqrt and sum(). "
-            "Include proper type hints and a docstring. "
-            "Make it production-ready with edge case handling. "
-            "Show the complete implementation."
-        )
-        time_b = time.time() - start_b
-        token_tracker["b"] = token_tracker.get("current", 0)
-
         print_response("Branch B result:", response_b)
+        print(f"\n  Wall time for both branches: {time_both:.1f}s")
 
-        stats_b = bt.get_branch_stats(USER, SESSION, "approach-pure-python")
-        nodes_b = ag.get_branch_nodes(USER, SESSION, branch_b_id)
+        stats_a = bt.get_branch_stats(USER, SESSION_A, "approach-statistics")
+        stats_b = bt.get_branch_stats(USER, SESSION_B, "approach-pure-python")
+        # Only ids and action types are needed below, so skip full node loads
+        ids_a, acts_a = ag.get_branch_action_summary(USER, SESSION_A, branch_a_id)
+        ids_b, acts_b = ag.get_branch_action_summary(USER, SESSION_B, branch_b_id)
 
         # ────────────────────────────────────────────────────────────
         # COMPARE: Side-by-side analysis
@@ -220,46 +246,51 @@ def main():
         print("  COMPARISON: Branch A vs Branch B")
         print(DIVIDER)
 
-        col_w = 20
-        lbl_w = 28
-        print(f"\n  {'Metric':<{lbl_w}} {'Statistics':>{col_w}} {'Pure Python':>{col_w}}")
-        print(f"  {'_'*lbl_w} {'_'*col_w} {'_'*col_w}")
-        print(f"  {'Branch name':<{lbl_w}} {'approach-statistics':>{col_w}} {'approach-pure-python':>{col_w}}")
-        print(f"  {'DAG nodes':<{lbl_w}} {len(nodes_a):>{col_w}} {len(nodes_b):>{col_w}}")
-        print(f"  {'LLM response time':<{lbl_w}} {f'{time_a:.1f}s':>{col_w}} {f'{time_b:.1f}s':>{col_w}}")
-        print(f"  {'Response length (chars)':<{lbl_w}} {len(response_a):>{col_w}} {len(response_b):>{col_w}}")
-        print(f"  {'External dependencies':<{lbl_w}} {'numpy, scipy':>{col_w}} {'none':>{col_w}}")
-
-        # Action type breakdown
-        types_a = Counter(n.action_type.value for n in nodes_a)
-        types_b = Counter(n.action_type.value for n in nodes_b)
-        all_types = sorted(set(list(types_a.keys()) + list(types_b.keys())))
+        print()
+        print(ROW_FMT.format("Metric", "Statistics", "Pure Python"))
+        print(RULE_ROW)
+        print(ROW_FMT.format("Branch name", "approach-statistics", "approach-pure-python"))
+        print(ROW_FMT.format("DAG nodes", len(ids_a), len(ids_b)))
+        print(ROW_FMT.format("LLM response time", f"{time_a:.1f}s", f"{time_b:.1f}s"))
+        print(ROW_FMT.format("Tokens used", tokens_a, tokens_b))
+        print(ROW_FMT.format("Response length (chars)", len(response_a), len(response_b)))
+        print(ROW_FMT.format("External dependencies", "numpy, scipy", "none"))
+
+        # Action type breakdown: one tally of [branch A, branch B] counts per type
+        tally = defaultdict(lambda: [0, 0])
+        for act in acts_a:
+            tally[act][0] += 1
+        for act in acts_b:
+            tally[act][1] += 1
 
         print(f"\n  Action breakdown:")
-        for t in all_types:
-            print(f"    {t:<{lbl_w-2}} {types_a.get(t, 0):>{col_w}} {types_b.get(t, 0):>{col_w}}")
+        for t in sorted(tally):
+            count_a, count_b = tally[t]
+            print(BREAKDOWN_FMT.format(t, count_a, count_b))
 
         # DAG structure
         print(f"\n  DAG Structure:")
         print(f"    Shared checkpoint:   node {checkpoint_node}")
-        if nodes_a:
-            print(f"    Branch A range:      node {nodes_a[0].id} -> {nodes_a[-1].id}")
-        if nodes_b:
-            print(f"    Branch B range:      node {nodes_b[0].id} -> {nodes_b[-1].id}")
+        if ids_a:
+            print(f"    Branch A range:      node {ids_a[0]} -> {ids_a[-1]}")
+        if ids_b:
+            print(f"    Branch B range:      node {ids_b[0]} -> {ids_b[-1]}")
         print(f"    Branches diverge from the same point - results are")
         print(f"    directly comparable with no cross-contamination.")
 
         # All branches summary
-        print(f"\n  All branches in session:")
-        for b in bt.list_branches(USER, SESSION):
-            node_count = len(ag.get_branch_nodes(USER, SESSION, b.branch_id))
-            print(f"    {b.name:<28} status={b.status.value:<12} nodes={node_count}")
-
-        # History / lineage check
-        if nodes_a and nodes_b:
-            history_a = ag.get_history(USER, SESSION, int(nodes_a[-1].id))
-            history_b = ag.get_history(USER, SESSION, int(nodes_b[-1].id))
-            shared = set(n.id for n in history_a) & set(n.id for n in history_b)
+        print(f"\n  All branches:")
+        for session_id in (SESSION, SESSION_A, SESSION_B):
+            for b in bt.list_branches(USER, session_id):
+                node_count = ag.count_branch_nodes(USER, session_id, b.branch_id)
+                print(BRANCH_FMT.format(b.name, b.status.value, node_count))
+
+        # History / lineage check (ids only; the path crosses into the parent
+        # session at the checkpoint)
+        if ids_a and ids_b:
+            history_a = ag.get_history_ids(USER, SESSION_A, ids_a[-1])
+            history_b = ag.get_history_ids(USER, SESSION_B, ids_b[-1])
+            shared = set(history_a) & set(history_b)
             print(f"\n  Lineage:")
             print(f"    Branch A full path:  {len(history_a)} nodes from root")
             print(f"    Branch B full path:  {len(history_b)} nodes from root")
@@ -274,10 +305,10 @@ def main():
         print("""
   1. Agent received a coding task
   2. AgentGit saved a checkpoint BEFORE the agent chose an approach
-  3. Branch A: Agent implemented using numpy/scipy
-  4. State restored to checkpoint (agent forgot Branch A entirely)
-  5. Branch B: Agent implemented using pure Python
-  6. Both branches compared from identical starting state
+  3. Two branches forked from that checkpoint, each with its own
+     copy of the conversation
+  4. Branch A (numpy/scipy) and Branch B (pure Python) ran concurrently
+  5. Both branches compared from identical starting state
 
   This is impossible with a linear conversation:
     - No context contamination between approaches
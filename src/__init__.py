@@ -2,17 +2,23 @@
 AgentGit - Multi-user DAG-based execution tracking for LangGraph agents
 """
 
-from .core import AgentGit, init
+import importlib
+
 from .event import Event, EventType
 from .eventbus import Eventbus
-from .models.dag import (
-    ExecutionNode,
-    Branch,
-    ActionType,
-    CallerType,
-    BranchStatus,
-    Checkpoint,
-)
+
+# Heavier exports (core pulls in storage, tracer and models) are imported on
+# first access, so importing just the event types stays cheap.
+_LAZY = {
+    "AgentGit": ".core",
+    "init": ".core",
+    "ExecutionNode": ".models.dag",
+    "Branch": ".models.dag",
+    "ActionType": ".models.dag",
+    "CallerType": ".models.dag",
+    "BranchStatus": ".models.dag",
+    "Checkpoint": ".models.dag",
+}
 
 __version__ = "0.1.0"
 __all__ = [
@@ -28,3 +34,16 @@ __all__ = [
     "BranchStatus",
     "Checkpoint",
 ]
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value  # cache so later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
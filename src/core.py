@@ -2,7 +2,7 @@
 AgentGit Core - LangGraph-integrated interface for agent execution tracking.
 
 Usage:
-    from core import AgentGit
+    from agentgit import AgentGit
     
     # Initialize
     ag = AgentGit("/path/to/project")
@@ -23,20 +23,25 @@ Usage:
     ag.close()
 """
 
+import time
+from array import array
 from pathlib import Path
 from datetime import datetime
-from typing import Optional, List, Callable
-
-from storage.dag_store import DagStore
-from storage.checkpoint_store import CheckpointStore
-from eventbus import Eventbus
-from event import Event, EventType
-from tracer import Tracer
-# from langgraph_callback import langgraph_callback  <-- moved inside get_callback
-from models.dag import (
+from typing import Optional, List, Callable, Tuple
+
+from .storage.dag_store import DagStore
+from .storage.checkpoint_store import CheckpointStore
+from .eventbus import Eventbus
+from .event import Event, EventType
+from .tracer import Tracer
+# from .langgraph_callback import langgraph_callback  <-- moved inside get_callback
+from .models.dag import (
     ExecutionNode, Branch, ActionType, CallerType, BranchStatus, Checkpoint
 )
 
+# Upper bound on cached ancestor nodes before the lineage cache is reset.
+_LINEAGE_CACHE_MAX = 10_000
+
 
 class AgentGit:
     """
@@ -70,11 +75,14 @@ class AgentGit:
         
         # Initialize tracer (subscribes to eventbus and records nodes)
         self._tracer = Tracer(self.dag_store)
-        self._tracer.eventbus = self.eventbus
-        self.eventbus.subscribe_all(self._tracer.handle_event)
+        self._tracer.attach(self.eventbus)
         
         # Stateless! No current_node_id, current_branch_id, etc.
 
+        # Nodes are immutable once written, so ancestors seen by get_history are
+        # kept and shared by every later path through them (e.g. sibling branches).
+        self._lineage_cache: dict[tuple[str, str, int], ExecutionNode] = {}
+
     # ─── LangGraph Integration ─────────────────────────────────────
 
     def get_callback(self) -> 'langgraph_callback':
@@ -86,7 +94,7 @@ class AgentGit:
             callback = ag.get_callback()
             app.invoke(input, config={"callbacks": [callback]})
         """
-        from langgraph_callback import langgraph_callback
+        from .langgraph_callback import langgraph_callback
         return langgraph_callback(self.eventbus)
 
     # ─── Event Subscription ────────────────────────────────────────
@@ -105,6 +113,8 @@ class AgentGit:
 
     def emit_user_input(self, user_id: str, session_id: str, message: str, metadata: Optional[dict] = None):
         """Convenience method to emit a user input event."""
+        if not self.eventbus.has_subscribers(EventType.USER_INPUT):
+            return
         self.eventbus.publish(
             EventType.USER_INPUT,
             Event(
@@ -113,7 +123,7 @@ class AgentGit:
                 session_id=session_id,
                 content=message,
                 metadata=metadata or {},
-                timestamp=datetime.now(),
+                timestamp=time.time_ns(),
             )
         )
 
@@ -132,8 +142,8 @@ class AgentGit:
             user_id=user_id,
             session_id=session_id,
             name=name,
-            head_node_id=str(base_node_id) if base_node_id else "0",
-            base_node_id=str(base_node_id) if base_node_id else "0",
+            head_node_id=base_node_id,
+            base_node_id=base_node_id,
             status=BranchStatus.ACTIVE,
             intent=intent,
             created_by=CallerType.SYSTEM,
@@ -157,18 +167,55 @@ class AgentGit:
         """Peek at the memory (content) for a given node number."""
         return self.dag_store.peek(user_id, session_id, node_id)
 
+    def peek_many(self, user_id: str, session_id: str, node_ids: List[int]) -> dict:
+        """Peek at several nodes in one query. Returns {node_id: content}."""
+        return self.dag_store.peek_many(user_id, session_id, node_ids)
+
     def get_node(self, user_id: str, session_id: str, node_id: int) -> Optional[ExecutionNode]:
         """Get full node details by ID."""
         return self.dag_store.get_node(user_id, session_id, node_id)
 
     def get_history(self, user_id: str, session_id: str, node_id: int) -> List[ExecutionNode]:
-        """Get the path from root to a given node."""
-        return self.dag_store.get_path_to_root(user_id, session_id, node_id)
+        """Get the path from root to a given node. Ancestors are fetched once and cached."""
+        if len(self._lineage_cache) > _LINEAGE_CACHE_MAX:
+            self._lineage_cache.clear()
+        path = []
+        current_id: Optional[int] = node_id
+        while current_id:
+            key = (user_id, session_id, current_id)
+            node = self._lineage_cache.get(key)
+            if node is None:
+                node = self.dag_store.get_node(user_id, session_id, current_id)
+                if not node:
+                    break
+                self._lineage_cache[key] = node
+            path.append(node)
+            current_id = node.parent_id
+        path.reverse()
+        return path
+
+    def get_history_ids(self, user_id: str, session_id: str, node_id: int) -> array:
+        """Get the node ids on the path from root to a given node (no node payloads)."""
+        return self.dag_store.get_path_ids_to_root(user_id, session_id, node_id)
 
     def get_branch_nodes(self, user_id: str, session_id: str, branch_id: int) -> List[ExecutionNode]:
         """Get all nodes in a branch."""
         return self.dag_store.get_branch_nodes(user_id, session_id, branch_id)
 
+    def count_branch_nodes(self, user_id: str, session_id: str, branch_id: int) -> int:
+        """Get the number of nodes in a branch."""
+        return self.dag_store.count_branch_nodes(user_id, session_id, branch_id)
+
+    def get_branch_action_summary(
+        self, user_id: str, session_id: str, branch_id: int
+    ) -> Tuple[array, List[str]]:
+        """Get (node ids, action types) for a branch without loading node payloads."""
+        return self.dag_store.get_branch_action_summary(user_id, session_id, branch_id)
+
+    def get_branch_columns(self, user_id: str, session_id: str, branch_id: int) -> dict:
+        """Get a branch's nodes as parallel columns (id, action_type, model, tool, ...)."""
+        return self.dag_store.get_branch_columns(user_id, session_id, branch_id)
+
     # ─── Checkpoint Operations ─────────────────────────────────────
 
     def checkpoint(
@@ -195,7 +242,7 @@ class AgentGit:
            node = ExecutionNode(
                 user_id=user_id,
                 session_id=session_id,
-                id="0", # Auto-generated
+                id=0, # Auto-generated
                 parent_id=parent_id,
                 checkpoint_sha=checkpoint.filesystem_ref, # Store git SHA!
                 action_type=ActionType.CHECKPOINT,
@@ -207,18 +254,32 @@ class AgentGit:
                 duration_ms=0,
                 token_count=0
            )
-           new_id = self.dag_store.insert_node(user_id, session_id, node, branch.branch_id)
-           # Update branch head!
-           self.dag_store.update_branch_head(user_id, session_id, branch.branch_id, new_id)
+           # Node, head move and checkpoint row land in a single commit
+           with self.dag_store.transaction():
+               new_id = self.dag_store.insert_node(user_id, session_id, node, branch.branch_id)
+               # Update branch head!
+               self.dag_store.update_branch_head(user_id, session_id, branch.branch_id, new_id)
 
-           # 3. Persist checkpoint metadata to database
-           self.dag_store.insert_checkpoint(checkpoint, new_id)
+               # 3. Persist checkpoint metadata to database
+               self.dag_store.insert_checkpoint(checkpoint, new_id)
 
         return checkpoint
 
     def restore(self, checkpoint: Checkpoint):
         """Restore from a checkpoint."""
-        self.checkpoint_store.restore_checkpoint(checkpoint)
+        self.restore_filesystem(checkpoint)
+
+    def restore_filesystem(self, checkpoint: Checkpoint, user_id: str = "default", session_id: str = "default"):
+        """Check out a checkpoint's file snapshot into the session's workspace.
+
+        Conversation state is left alone: agents that keep it in a LangGraph
+        thread fork that thread instead (see restore_conversation).
+        """
+        self.checkpoint_store.restore_checkpoint(checkpoint, user_id, session_id)
+
+    def restore_conversation(self, checkpoint: Checkpoint) -> list:
+        """Return a copy of the conversation saved with a checkpoint, without touching files."""
+        return list(checkpoint.conversation_history)
 
     # ─── Properties ────────────────────────────────────────────────
 
@@ -233,9 +294,14 @@ class AgentGit:
 
     # ─── Lifecycle ─────────────────────────────────────────────────
 
+    def transaction(self):
+        """Batch DAG writes made inside the block into a single commit."""
+        return self.dag_store.transaction()
+
     def close(self):
         """Close database connections."""
-        self.dag_store.conn.close()
+        self.checkpoint_store.close()
+        self.dag_store.close()
 
 
 # ─── Quick Start Helper ────────────────────────────────────────────
@@ -245,7 +311,7 @@ def init(project_dir: str = ".") -> AgentGit:
     Quick initialization helper.
     
     Usage:
-        from core import init
+        from agentgit import init
         
         ag = init()
         # Session context is required for operations
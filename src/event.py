@@ -1,7 +1,8 @@
+import time
 from enum import Enum
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Optional, Union
 
 
 class EventType(Enum):
@@ -19,11 +20,11 @@ class EventType(Enum):
     AGENT_THINKING = "agent_thinking"
 
 
-@dataclass
+@dataclass(slots=True)
 class Event:
     """Payload for every event in the system."""
     type: EventType
-    timestamp: datetime = field(default_factory=datetime.now)
+    timestamp: Union[int, datetime] = field(default_factory=time.time_ns)  # int: epoch ns
     user_id: Optional[str] = None
     session_id: Optional[str] = None
     run_id: Optional[str] = None
@@ -38,4 +39,11 @@ class Event:
     model: Optional[str] = None
     usage: Optional[dict] = None
     duration_ms: int = 0
-    metadata: dict = field(default_factory=dict)
\ No newline at end of file
+    metadata: dict = field(default_factory=dict)
+
+    @property
+    def timestamp_dt(self) -> datetime:
+        """Event time as a datetime, converting epoch nanoseconds on demand."""
+        if isinstance(self.timestamp, datetime):
+            return self.timestamp
+        return datetime.fromtimestamp(self.timestamp / 1e9)
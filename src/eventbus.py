@@ -1,20 +1,31 @@
+import threading
 from typing import Callable
 
-from event import EventType, Event
+from .event import EventType, Event
 class Eventbus:
     def __init__(self):
-        self._subscribers = {}
+        # event type -> subscriber tuple; rebuilt on subscribe so publish only iterates
+        self._subscribers: dict[EventType, tuple[Callable[[Event], None], ...]] = {}
+        # Serializes subscribers' read-modify-write; publish reads lock-free
+        self._lock = threading.Lock()
     
     def subscribe(self, event_type: EventType, callback: Callable[[Event], None]):
-        if event_type not in self._subscribers:
-            self._subscribers[event_type] = []
-        self._subscribers[event_type].append(callback)
+        with self._lock:
+            self._subscribers[event_type] = self._subscribers.get(event_type, ()) + (callback,)
     
+    @property
+    def dispatch_table(self) -> dict[EventType, tuple[Callable[[Event], None], ...]]:
+        """Live event type -> subscriber tuple map, for publishers that dispatch inline."""
+        return self._subscribers
+
+    def has_subscribers(self, event_type: EventType) -> bool:
+        """Whether publishing this type reaches anyone; lets publishers skip building payloads."""
+        return bool(self._subscribers.get(event_type))
+
     def publish(self, event_type: EventType, event: Event):
-        if event_type in self._subscribers:
-            for callback in self._subscribers[event_type]:
-                callback(event)
+        for callback in self._subscribers.get(event_type, ()):
+            callback(event)
 
     def subscribe_all(self, callback: Callable[[Event], None]):
         for event_type in EventType:
-            self.subscribe(event_type, callback)
\ No newline at end of file
+            self.subscribe(event_type, callback)
@@ -5,12 +5,19 @@ from typing import Any, Dict, List, Optional, Union
 from langchain_core.messages import BaseMessage
 from langchain_core.callbacks import BaseCallbackHandler
 
-from eventbus import Eventbus
-from event import Event, EventType
+from .eventbus import Eventbus
+from .event import Event, EventType
 class langgraph_callback(BaseCallbackHandler):
+    # Async graphs otherwise hand sync handlers to a thread pool; running inline
+    # keeps each run's events in order. Handlers can still be called from
+    # executor threads (sync nodes, tools), so none of them assume one thread.
+    run_inline = True
+
     def __init__(self, eventbus):
         super().__init__()
         self.eventbus = eventbus
+        # Live EventType -> subscriber tuple map; hooks dispatch from it directly
+        self._dispatch = eventbus.dispatch_table if eventbus else {}
         self._runs = {}
         self._tool_runs = {}
         self._context_map = {} # run_id -> (user_id, session_id)
@@ -42,46 +49,42 @@ class langgraph_callback(BaseCallbackHandler):
         # print(f"DEBUG: on_chain_start run_id={run_id} parent={parent_run_id}")
         user_id, session_id = self._get_session_context(kwargs, str(run_id), str(parent_run_id) if parent_run_id else None, metadata)
         self._context_map[str(run_id)] = (user_id, session_id)
-    
 
-    def _extract_model(self, serialized: Dict, kwargs: Dict) -> str:
-        inv = kwargs.get("invocation_params", {})
-        return (
-            inv.get("model_name")
-            or inv.get("model")
-            or (serialized or {}).get("name", "unknown")
-        )
-    
     def on_chat_model_start(self, serialized: dict[str, Any], messages: list[list[BaseMessage]], *, run_id: UUID, parent_run_id: UUID | None = None, tags: list[str] | None = None, metadata: dict[str, Any] | None = None, **kwargs: Any):
         user_id, session_id = self._get_session_context(kwargs, str(run_id), str(parent_run_id) if parent_run_id else None, metadata)
         self._context_map[str(run_id)] = (user_id, session_id)
-        model = self._extract_model(serialized, kwargs)
-        
-        flat_messages = []
-        for batch in messages:
-            for msg in batch:
-                flat_messages.append({
-                    "role": getattr(msg, "type", "unknown"),
-                    "content": str(msg.content)
-                })
-        
+        now = time.time_ns()
+        inv = kwargs.get("invocation_params") or {}
+        model = inv.get("model_name") or inv.get("model") or (serialized or {}).get("name", "unknown")
+
         self._runs[run_id] = {
             "model": model,
-            "start_time": time.time(),
-            "messages": flat_messages,
-            "chunks" : []
+            "start_time": now,
         }
 
-        if self.eventbus:
-            self.eventbus.publish(EventType.LLM_CALL_START, Event(
+        # The flattened prompt only feeds the event, so skip it when nobody listens
+        subscribers = self._dispatch.get(EventType.LLM_CALL_START)
+        if subscribers:
+            # Message content is almost always already a str; only convert the rest
+            flat_messages = [
+                {
+                    "role": getattr(msg, "type", "unknown"),
+                    "content": c if type(c := msg.content) is str else str(c),
+                }
+                for batch in messages
+                for msg in batch
+            ]
+            event = Event(
                 type=EventType.LLM_CALL_START,
                 user_id=user_id,
                 session_id=session_id,
                 run_id=str(run_id),
                 model=model,
                 messages=flat_messages,
-                timestamp=time.time()
-            ))
+                timestamp=now
+            )
+            for callback in subscribers:
+                callback(event)
 
 
         
@@ -93,18 +96,28 @@ class langgraph_callback(BaseCallbackHandler):
         if not run:
             return
 
-        duration = int((time.time() - run.get("start_time")) * 1000)
+        now = time.time_ns()
+        duration = (now - run["start_time"]) // 1_000_000
         run["duration_ms"] = duration
 
         text = None
         usage = None
-        if response.generations and response.generations[0]:
+        subscribers = self._dispatch.get(EventType.LLM_CALL_END)
+        if subscribers and response.generations and response.generations[0]:
             gen = response.generations[0][0]
             if hasattr(gen, "message"):
                 text = str(gen.message.content) if gen.message.content else None
                 meta = getattr(gen.message, "response_metadata", {}) or {}
                 usage = meta.get("usage", {})
-                if usage:
+                # Streamed generations only carry the standard usage_metadata
+                usage_meta = getattr(gen.message, "usage_metadata", None)
+                if not usage and usage_meta:
+                    usage = {
+                        "prompt_tokens": usage_meta.get("input_tokens"),
+                        "completion_tokens": usage_meta.get("output_tokens"),
+                        "total_tokens": usage_meta.get("total_tokens")
+                    }
+                elif usage:
                     usage = {
                         "prompt_tokens": usage.get("prompt_tokens"),
                         "completion_tokens": usage.get("completion_tokens"),
@@ -113,17 +126,18 @@ class langgraph_callback(BaseCallbackHandler):
             elif hasattr(gen, "text"):
                 text = str(gen.text) if gen.text else None
 
-            if self.eventbus:
-                self.eventbus.publish(EventType.LLM_CALL_END, Event(
-                    type=EventType.LLM_CALL_END,
-                    user_id=user_id,
-                    session_id=session_id,
-                    run_id=str(run_id),
-                    text=text,
-                    usage=usage,
-                    duration_ms=duration,
-                    timestamp=time.time()
-                ))
+            event = Event(
+                type=EventType.LLM_CALL_END,
+                user_id=user_id,
+                session_id=session_id,
+                run_id=str(run_id),
+                text=text,
+                usage=usage,
+                duration_ms=duration,
+                timestamp=now
+            )
+            for callback in subscribers:
+                callback(event)
 
         # Clean up to prevent memory leak
         self._runs.pop(run_id, None)
@@ -132,14 +146,17 @@ class langgraph_callback(BaseCallbackHandler):
     def on_llm_error(self, error: Exception, *, run_id: str,**kwargs):
         run = self._runs.get(run_id, {})
 
-        if self.eventbus:
-            self.eventbus.publish(EventType.LLM_ERROR, Event(
+        subscribers = self._dispatch.get(EventType.LLM_ERROR)
+        if subscribers:
+            event = Event(
                 type=EventType.LLM_ERROR,
                 run_id=str(run_id),
                 model=run.get("model", "unknown"),
                 error=str(error),
-                timestamp=time.time()
-            ))
+                timestamp=time.time_ns()
+            )
+            for callback in subscribers:
+                callback(event)
 
         # Clean up to prevent memory leak
         self._runs.pop(run_id, None)
@@ -148,31 +165,37 @@ class langgraph_callback(BaseCallbackHandler):
     def on_tool_start( self, serialized: Dict[str, Any], input_str: str, *, run_id: str, inputs: Optional[Dict] = None, **kwargs):
         name = (serialized or {}).get("name", "unknown")
         args = inputs if inputs else {"input": input_str}
+        now = time.time_ns()
         
         self._tool_runs[run_id] = {
             "name": name,
             "args": args,
-            "start_time": time.time()
+            "start_time": now
         }
         
         # Publish event
-        if self.eventbus:
-            self.eventbus.publish(EventType.TOOL_CALL_START, Event(
+        subscribers = self._dispatch.get(EventType.TOOL_CALL_START)
+        if subscribers:
+            event = Event(
                 type=EventType.TOOL_CALL_START,
                 run_id=str(run_id),
                 tool_name=name,
                 tool_args=args,
-                timestamp=time.time()
-            ))
+                timestamp=now
+            )
+            for callback in subscribers:
+                callback(event)
     
     def on_tool_end( self, output: str, *, run_id: str, **kwargs):
         run = self._tool_runs.pop(run_id, {})
-        duration_ms = int((time.time() - run.get("start_time", time.time())) * 1000)
+        now = time.time_ns()
+        duration_ms = (now - run.get("start_time", now)) // 1_000_000
         
         # Publish event
-        if self.eventbus:
+        subscribers = self._dispatch.get(EventType.TOOL_CALL_END)
+        if subscribers:
             user_id, session_id = self._context_map.get(str(run_id), ("default", "default"))
-            self.eventbus.publish(EventType.TOOL_CALL_END, Event(
+            event = Event(
                 type=EventType.TOOL_CALL_END,
                 user_id=user_id,
                 session_id=session_id,
@@ -180,20 +203,25 @@ class langgraph_callback(BaseCallbackHandler):
                 tool_name=run.get("name", "unknown"),
                 content=str(output),
                 duration_ms=duration_ms,
-                timestamp=time.time()
-            ))
+                timestamp=now
+            )
+            for callback in subscribers:
+                callback(event)
 
     def on_tool_error(self, error: Exception, *, run_id: str, **kwargs):
         run = self._tool_runs.pop(run_id, {})
 
-        if self.eventbus:
-            self.eventbus.publish(EventType.TOOL_ERROR, Event(
+        subscribers = self._dispatch.get(EventType.TOOL_ERROR)
+        if subscribers:
+            event = Event(
                 type=EventType.TOOL_ERROR,
                 run_id=str(run_id),
                 tool_name=run.get("name", "unknown"),
                 error=str(error),
-                timestamp=time.time()
-            ))
+                timestamp=time.time_ns()
+            )
+            for callback in subscribers:
+                callback(event)
 
     def on_chain_end(self, outputs: Dict[str, Any], *, run_id: str, **kwargs):
         """Called when a chain completes - publishes chain_end event."""
@@ -201,40 +229,56 @@ class langgraph_callback(BaseCallbackHandler):
         # Don't restrict to only LLM runs - chains can complete without being in self._runs
         # This happens in LangGraph where chains orchestrate multiple steps
 
-        if self.eventbus:
+        run_key = str(run_id)
+        subscribers = self._dispatch.get(EventType.AGENT_TURN_END)
+        if subscribers:
+            now = time.time_ns()
             # Handle different output formats
             event_data = {
-                "run_id": str(run_id),
-                "timestamp": time.time()
+                "run_id": run_key,
+                "timestamp": now / 1e9
             }
 
             # If outputs contains messages, include them
             if isinstance(outputs, dict) and "messages" in outputs:
                 messages = outputs["messages"]
                 if isinstance(messages, list):
-                    # Convert messages to serializable format
-                    event_data["messages"] = [
-                        {
-                            "type": getattr(msg, "type", "unknown"),
-                            "content": str(getattr(msg, "content", ""))
-                        } for msg in messages
-                    ]
+                    # Convert messages to serializable format. LangChain messages
+                    # always carry .type/.content, so read them directly and
+                    # only fall back to defaults for foreign objects.
+                    try:
+                        event_data["messages"] = [
+                            {"type": msg.type, "content": c if type(c := msg.content) is str else str(c)}
+                            for msg in messages
+                        ]
+                    except AttributeError:
+                        event_data["messages"] = [
+                            {
+                                "type": getattr(msg, "type", "unknown"),
+                                "content": c if type(c := getattr(msg, "content", "")) is str else str(c)
+                            } for msg in messages
+                        ]
             else:
-                # Include raw outputs for other chain types
                 event_data["outputs"] = str(outputs)
 
-            user_id, session_id = self._context_map.get(str(run_id), ("default", "default"))
-            self.eventbus.publish(EventType.AGENT_TURN_END, Event(
+            user_id, session_id = self._context_map.get(run_key, ("default", "default"))
+            event = Event(
                 type=EventType.AGENT_TURN_END,
                 user_id=user_id,
                 session_id=session_id,
-                run_id=str(run_id),
+                run_id=run_key,
                 outputs=event_data,
-                timestamp=time.time()
-            ))
+                timestamp=now
+            )
+            for callback in subscribers:
+                callback(event)
 
         # Clean up context map to prevent memory leak
         # Remove this run_id from context map after chain completes
+        self._context_map.pop(run_key, None)
+
+    def on_chain_error(self, error: BaseException, *, run_id: str, **kwargs):
+        """Drop the failed run's session context, as on_chain_end does."""
         self._context_map.pop(str(run_id), None)
     
 
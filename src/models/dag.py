@@ -33,13 +33,13 @@ class BranchStatus(Enum):
     MERGED = "merged"
 
 
-@dataclass
+@dataclass(slots=True)
 class ExecutionNode:
     """Lightweight node (~1KB) created for every agent action. Forms the DAG."""
     user_id: str
     session_id: str
-    id: str
-    parent_id: Optional[str]
+    id: int
+    parent_id: Optional[int]
     action_type: ActionType
     content: dict
 
@@ -54,14 +54,14 @@ class ExecutionNode:
     checkpoint_sha: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Branch:
     """Named pointer to a position in the DAG."""
     user_id: str
     session_id: str
     name: str
-    head_node_id: str
-    base_node_id: str
+    head_node_id: Optional[int]
+    base_node_id: Optional[int]
 
     status: BranchStatus
     intent: str
@@ -73,9 +73,10 @@ class Branch:
     time_elapsed_seconds: float = 0.0
 
     branch_id: Optional[int] = None
+    status_reason: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class Checkpoint:
     """Heavy state snapshot. Only created explicitly."""
     hash: str
@@ -1,12 +1,18 @@
 import json
-import gzip
 import hashlib
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
-from storage.git_backend import GitBackend
-from models.dag import Checkpoint
-from storage.dag_store import DagStore
+from .git_backend import GitBackend
+from ..models.dag import Checkpoint
+from .dag_store import DagStore
+
+# Canonical (sorted, compact) encoding used for checkpoint content hashes
+_canonical_dumps = json.JSONEncoder(
+    sort_keys=True, separators=(",", ":"), ensure_ascii=False
+).encode
 
 
 class CheckpointStore:
@@ -15,6 +21,10 @@ class CheckpointStore:
         self.project_dir = project_dir
         self.dag_store = dag_store
         self.git_back = GitBackend(agit_path / "snapshots.git")
+        # Git snapshots run here so they overlap with hashing the agent state
+        self._git_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="agentgit-snapshot")
+        # (user_id, session_id) -> most recent checkpoint, to short-circuit repeats
+        self._last_checkpoints: dict[tuple[str, str], Checkpoint] = {}
     
     def _get_workspace(self, user_id: str, session_id: str) -> Path:
         """Get isolated workspace for session. Defaults to project_dir if session='default' (optional)."""
@@ -40,19 +50,46 @@ class CheckpointStore:
         conversation_history: list,
         label: str = "Checkpoint"
     ) -> Checkpoint:
-        """Snapshot agent state. Returns the Checkpoint object."""
+        """Snapshot agent state. Returns the Checkpoint object.
+
+        A checkpoint identical to the session's previous one (same files and
+        state) reuses that Checkpoint under the new label. This only saves
+        rebuilding the object: the workspace is still scanned, since that is
+        how an unchanged snapshot is detected, and AgentGit.checkpoint still
+        records a DAG node for it. The previous checkpoint is remembered per
+        session in this process only, one entry per session, and is not
+        persisted.
+        """
         workspace = self._get_workspace(user_id, session_id)
         
         # 1. Get parent SHA from DagStore
         parent_node = self.dag_store.get_latest_checkpoint(user_id, session_id)
         parent_sha = parent_node.checkpoint_sha if parent_node else None
         
-        # 2. Create commit (stateless)
-        git_sha = self.git_back.create_commit(workspace, parent_sha, label)
+        # 2. Create commit (stateless) in the background while the state is hashed
+        git_future = self._git_executor.submit(self.git_back.create_commit, workspace, parent_sha, label)
         
-        # Create hash from memory + history
-        content_str = json.dumps({"memory": agent_memory, "history": conversation_history}, sort_keys=True)
-        checkpoint_hash = hashlib.sha256(content_str.encode()).hexdigest()[:12]
+        # Hash memory + history incrementally, one message at a time, instead of
+        # materializing the whole state as a single JSON document
+        # Ids only need to be unique, not cryptographic: BLAKE2b is the fastest
+        # hashlib digest and digest_size=6 yields the 12 hex chars directly
+        digest = hashlib.blake2b(digest_size=6)
+        # Scoped to the session, so two sessions never share a checkpoint row
+        digest.update(f"{user_id}\0{session_id}\0".encode())
+        for part in (agent_memory, *conversation_history):
+            digest.update(_canonical_dumps(part).encode())
+            digest.update(b"\n")  # keeps adjacent scalar parts unambiguous
+        git_sha = git_future.result()
+        digest.update(git_sha.encode())  # same state but different files is a new checkpoint
+        checkpoint_hash = digest.hexdigest()
+
+        # Unchanged since the session's last checkpoint (git reused the parent
+        # snapshot and the state hashes equal): reuse that checkpoint's state
+        # under the new label
+        key = (user_id, session_id)
+        last = self._last_checkpoints.get(key)
+        if last is not None and last.hash == checkpoint_hash:
+            return last if last.label == label else replace(last, label=label)
         
         checkpoint = Checkpoint(
             hash=checkpoint_hash,
@@ -61,10 +98,11 @@ class CheckpointStore:
             filesystem_ref=git_sha,
             files_changed=[],  # Could be populated from git diff
             created_at=datetime.now(),
-            compressed=False,
-            size_bytes=len(content_str),
+            compressed=True,
+            size_bytes=0,  # the stored (compressed) size, set when the row is inserted
             label=label,
         )
+        self._last_checkpoints[key] = checkpoint
         
         return checkpoint
     
@@ -72,4 +110,8 @@ class CheckpointStore:
         """Restore filesystem state from a checkpoint."""
         workspace = self._get_workspace(user_id, session_id)
         if checkpoint.filesystem_ref:
-            self.git_back.restore_commit(checkpoint.filesystem_ref, workspace)
\ No newline at end of file
+            self.git_back.restore_commit(checkpoint.filesystem_ref, workspace)
+
+    def close(self):
+        """Wait for any in-flight snapshot and stop the snapshot worker."""
+        self._git_executor.shutdown(wait=True)
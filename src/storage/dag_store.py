@@ -1,20 +1,125 @@
 import sqlite3
 import json
+import threading
+import zlib
+from array import array
+from contextlib import contextmanager
+from dataclasses import replace
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime
 
-from models.dag import (
+from ..models.dag import (
     ExecutionNode, Branch, ActionType, CallerType, BranchStatus, Checkpoint,
 )
 
+# Explicit projections keep row layouts stable regardless of table column order
+# and keep large payload columns (checkpoint memory/history) out of list reads.
+_NODE_COLUMNS = (
+    "id, parent_id, branch_id, user_id, session_id, checkpoint_sha, action_type, "
+    "content, triggered_by, caller_context, state_hash, timestamp, duration_ms, token_count"
+)
+_BRANCH_COLUMNS = (
+    "branch_id, name, user_id, session_id, head_node_id, base_node_id, status, intent, "
+    "status_reason, created_by, created_at, tokens_used, time_elapsed_seconds"
+)
+_CHECKPOINT_COLUMNS = (
+    "hash, node_id, filesystem_ref, files_changed, created_at, compressed, size_bytes"
+)
+
+# Hot-path queries are built once, so every call hands sqlite3 the same string
+# and hits its prepared-statement cache without re-formatting the SQL.
+_SELECT_NODE_BY_ID = (
+    f"SELECT {_NODE_COLUMNS} FROM nodes WHERE user_id = ? AND session_id = ? AND id = ?"
+)
+_SELECT_ACTIVE_BRANCH = (
+    f"""SELECT {_BRANCH_COLUMNS} FROM branches WHERE user_id = ? AND session_id = ? AND status = ? 
+       ORDER BY created_at DESC, branch_id DESC LIMIT 1"""
+)
+
+# Canonical write statements: one SQL string per table and operation
+_INSERT_NODE = """INSERT INTO nodes (
+    user_id, session_id, parent_id, branch_id, checkpoint_sha,
+    action_type, content, triggered_by, caller_context, state_hash,
+    timestamp, duration_ms, token_count
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+_INSERT_BRANCH = """INSERT INTO branches (
+    user_id, session_id, name, head_node_id, base_node_id, status, intent,
+    status_reason, created_by, created_at, tokens_used, time_elapsed_seconds
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+_UPDATE_BRANCH_HEAD = """UPDATE branches SET head_node_id = ?
+    WHERE user_id = ? AND session_id = ? AND branch_id = ?"""
+_UPDATE_BRANCH_STATUS = """UPDATE branches SET status = ?, status_reason = ?
+    WHERE user_id = ? AND session_id = ? AND branch_id = ?"""
+_INSERT_CHECKPOINT = """INSERT INTO checkpoints (
+    hash, node_id, filesystem_ref, files_changed,
+    memory, history, created_at, compressed, size_bytes
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+# Stay under SQLite's bound-parameter limit when expanding IN (...) lists
+_MAX_IN_PARAMS = 900
+
+# One shared compact encoder for JSON columns: no padding after separators and
+# no \uXXXX escaping of non-ASCII text, so long histories encode smaller.
+_json_dumps = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+
+def _compress_json_list(items: list) -> bytes:
+    """Deflate a list as a JSON array, encoding one element at a time.
+
+    Long conversation histories never exist as one big JSON string; only the
+    compressed output is held in memory.
+    """
+    z = zlib.compressobj(1)
+    parts = [z.compress(b"[")]
+    for i, item in enumerate(items):
+        if i:
+            parts.append(z.compress(b","))
+        parts.append(z.compress(_json_dumps(item).encode()))
+    parts.append(z.compress(b"]"))
+    parts.append(z.flush())
+    return b"".join(parts)
+
 
 class DagStore:
     """Persists execution nodes and branches in SQLite. Loads schema.sql on init."""
 
     def __init__(self, db_path: str):
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=512)
+        # Only takes effect on a new database, so it has to precede WAL and the schema
+        self.conn.execute("PRAGMA page_size=8192")
+        # WAL + NORMAL: commits append to the log and fsync only at checkpoints.
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA wal_autocheckpoint=1000")  # pages between checkpoints
+        # Wait on a lock held by another process instead of failing immediately
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        # ~20MB page cache, in-memory temp tables, and mmap'd reads for
+        # history/peek lookups over large DAGs
+        self.conn.execute("PRAGMA cache_size=-20000")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute("PRAGMA mmap_size=268435456")
+        # The write connection is shared, so one thread at a time may write
+        # through it: a transaction() holds this lock until it finishes.
+        self._write_lock = threading.RLock()
+        self._tx_depth = 0
+        self._tx_owner: Optional[int] = None  # thread ident holding the open transaction
+        # (user_id, session_id) -> active Branch (or None). Every event the tracer
+        # records needs it, so keep it in memory and patch it on branch writes.
+        self._active_branches: dict[tuple[str, str], Optional[Branch]] = {}
+        # (user_id, session_id, name) -> Branch for by-name lookups from the tools,
+        # plus branch_id -> that key so writes by id can drop the entry.
+        self._branches: dict[tuple[str, str, str], Branch] = {}
+        self._branch_keys: dict[int, tuple[str, str, str]] = {}
+        # Per-thread read-only handles so node/checkpoint reads from other
+        # threads don't queue behind writes on self.conn (WAL lets readers run
+        # alongside the writer). An in-memory database is private to its
+        # connection, so it reads through self.conn.
+        self._local = threading.local()
+        self._readers: list[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._shared_reads = db_path == ":memory:"
         self._init_schema()
 
     def _init_schema(self):
@@ -23,67 +128,221 @@ class DagStore:
             self.conn.executescript(f.read())
         self.conn.commit()
 
+    # ─── Transactions ─────────────────────────────────────────────
+
+    def _begin(self):
+        """Open (or join) the write transaction; paired with _end() on the same
+        thread. Other threads' writes wait until it ends."""
+        self._write_lock.acquire()
+        if not self._tx_depth:
+            self._tx_owner = threading.get_ident()
+            if not self.conn.in_transaction:
+                # Explicit, so a nested block's SAVEPOINT never opens (and its
+                # RELEASE never commits) the outer transaction
+                self.conn.execute("BEGIN")
+        self._tx_depth += 1
+
+    def _end(self):
+        """Leave the write transaction; the outermost _end() commits it."""
+        try:
+            if self._tx_depth == 1:
+                self.conn.commit()
+        finally:
+            self._leave()
+
+    def _leave(self):
+        """Drop one level of transaction nesting and its hold on the write lock."""
+        self._tx_depth -= 1
+        if not self._tx_depth:
+            self._tx_owner = None
+        self._write_lock.release()
+
+    @contextmanager
+    def transaction(self):
+        """Group several writes into one commit. A nested block runs in a
+        SAVEPOINT, so an error inside it undoes only that block's writes."""
+        self._begin()
+        savepoint = None
+        if self._tx_depth > 1:
+            savepoint = f"agentgit_{self._tx_depth}"
+            self.conn.execute(f"SAVEPOINT {savepoint}")
+        try:
+            yield self.conn
+        except BaseException:
+            try:
+                if savepoint:
+                    self.conn.execute(f"ROLLBACK TO {savepoint}")
+                    self.conn.execute(f"RELEASE {savepoint}")
+                else:
+                    self.conn.rollback()
+                self._active_branches.clear()  # may hold rolled-back heads
+                self._branches.clear()
+                self._branch_keys.clear()
+            finally:
+                self._leave()
+            raise
+        if savepoint:
+            self.conn.execute(f"RELEASE {savepoint}")
+        self._end()
+
+    def _commit(self):
+        """Commit unless an enclosing transaction() will."""
+        if not self._tx_depth:
+            self.conn.commit()
+
+    def _reader(self) -> sqlite3.Connection:
+        """Connection for a standalone read: this thread's read handle, or the
+        write connection inside this thread's open transaction, so reads see its
+        uncommitted rows."""
+        if self._shared_reads or self._tx_owner == threading.get_ident():
+            return self.conn
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit, so each SELECT reads the latest committed snapshot
+            conn = sqlite3.connect(
+                self.db_path, check_same_thread=False, isolation_level=None, cached_statements=512
+            )
+            conn.execute("PRAGMA query_only=ON")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("PRAGMA mmap_size=268435456")
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def close(self):
+        """Commit any open writes and close all connections."""
+        with self._write_lock:
+            self.conn.commit()
+            with self._readers_lock:
+                for conn in self._readers:
+                    conn.close()
+                self._readers.clear()
+            self.conn.close()
+
     # ─── Nodes ────────────────────────────────────────────────────
 
     def insert_node(self, user_id: str, session_id: str, node: ExecutionNode, branch_id: int) -> int:
         """Insert node and return the auto-generated INTEGER id."""
-        cursor = self.conn.execute(
-            """INSERT INTO nodes (
-                user_id, session_id, parent_id, branch_id, checkpoint_sha,
-                action_type, content, triggered_by, caller_context, state_hash,
-                timestamp, duration_ms, token_count
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                user_id,
-                session_id,
-                int(node.parent_id) if node.parent_id else None,
-                branch_id,
-                node.checkpoint_sha,
-                node.action_type.value,
-                json.dumps(node.content),
-                node.triggered_by.value,
-                json.dumps(node.caller_context),
-                node.state_hash,
-                int(node.timestamp.timestamp()),
-                node.duration_ms,
-                node.token_count,
-            ),
-        )
-        self.conn.commit()
-        return cursor.lastrowid
+        with self._write_lock:
+            cursor = self.conn.execute(
+                _INSERT_NODE,
+                (
+                    user_id,
+                    session_id,
+                    node.parent_id,
+                    branch_id,
+                    node.checkpoint_sha,
+                    node.action_type.value,
+                    _json_dumps(node.content),
+                    node.triggered_by.value,
+                    _json_dumps(node.caller_context),
+                    node.state_hash,
+                    int(node.timestamp.timestamp()),
+                    node.duration_ms,
+                    node.token_count,
+                ),
+            )
+            self._commit()
+            return cursor.lastrowid
 
     def get_node(self, user_id: str, session_id: str, node_id: int) -> Optional[ExecutionNode]:
-        row = self.conn.execute(
-            "SELECT * FROM nodes WHERE user_id = ? AND session_id = ? AND id = ?",
-            (user_id, session_id, node_id)
+        row = self._reader().execute(
+            _SELECT_NODE_BY_ID, (user_id, session_id, node_id)
         ).fetchone()
         return self._row_to_node(row) if row else None
 
     def peek(self, user_id: str, session_id: str, node_id: int) -> Optional[dict]:
         """Peek at the memory (content) for a given node number."""
-        row = self.conn.execute(
+        row = self._reader().execute(
             "SELECT content FROM nodes WHERE user_id = ? AND session_id = ? AND id = ?",
             (user_id, session_id, node_id)
         ).fetchone()
         return json.loads(row[0]) if row else None
 
+    def peek_many(self, user_id: str, session_id: str, node_ids: List[int]) -> dict[int, dict]:
+        """Content for several nodes at once, keyed by node id (missing ids are omitted)."""
+        contents = {}
+        ids = list(node_ids)
+        conn = self._reader()
+        for start in range(0, len(ids), _MAX_IN_PARAMS):
+            chunk = ids[start:start + _MAX_IN_PARAMS]
+            rows = conn.execute(
+                f"""SELECT id, content FROM nodes
+                   WHERE user_id = ? AND session_id = ? AND id IN ({",".join("?" * len(chunk))})""",
+                (user_id, session_id, *chunk)
+            ).fetchall()
+            for node_id, content in rows:
+                contents[node_id] = json.loads(content)
+        return contents
+
     def get_children(self, user_id: str, session_id: str, node_id: int) -> List[ExecutionNode]:
-        rows = self.conn.execute(
-            "SELECT * FROM nodes WHERE user_id = ? AND session_id = ? AND parent_id = ?",
+        rows = self._reader().execute(
+            f"SELECT {_NODE_COLUMNS} FROM nodes WHERE user_id = ? AND session_id = ? AND parent_id = ?",
             (user_id, session_id, node_id)
         ).fetchall()
         return [self._row_to_node(row) for row in rows]
 
     def get_branch_nodes(self, user_id: str, session_id: str, branch_id: int) -> List[ExecutionNode]:
         """Get all nodes belonging to a specific branch."""
-        rows = self.conn.execute(
-            """SELECT * FROM nodes 
+        rows = self._reader().execute(
+            f"""SELECT {_NODE_COLUMNS} FROM nodes 
                WHERE user_id = ? AND session_id = ? AND branch_id = ? 
                ORDER BY timestamp""",
             (user_id, session_id, branch_id)
         ).fetchall()
         return [self._row_to_node(row) for row in rows]
 
+    def count_branch_nodes(self, user_id: str, session_id: str, branch_id: int) -> int:
+        """Number of nodes on a branch, counted in SQLite without fetching rows."""
+        return self._reader().execute(
+            "SELECT COUNT(*) FROM nodes WHERE user_id = ? AND session_id = ? AND branch_id = ?",
+            (user_id, session_id, branch_id)
+        ).fetchone()[0]
+
+    def get_branch_action_summary(
+        self, user_id: str, session_id: str, branch_id: int
+    ) -> Tuple[array, List[str]]:
+        """Node ids and action types of a branch as parallel columns.
+
+        Reads only the two columns, skipping JSON decoding and node construction.
+        """
+        rows = self._reader().execute(
+            """SELECT id, action_type FROM nodes
+               WHERE user_id = ? AND session_id = ? AND branch_id = ?
+               ORDER BY timestamp""",
+            (user_id, session_id, branch_id)
+        ).fetchall()
+        return array("q", (row[0] for row in rows)), [row[1] for row in rows]
+
+    def get_branch_columns(self, user_id: str, session_id: str, branch_id: int) -> dict:
+        """A branch's nodes as parallel columns (struct of arrays), in node order.
+
+        The commonly read content fields (model, tool, total tokens) are pulled
+        out by SQLite's json_extract, so no per-node json.loads happens in Python.
+        Keys: id, action_type, model, tool, total_tokens, duration_ms.
+        """
+        rows = self._reader().execute(
+            """SELECT id, action_type,
+                      json_extract(content, '$.model'),
+                      json_extract(content, '$.tool'),
+                      json_extract(content, '$.usage.total_tokens'),
+                      duration_ms
+               FROM nodes
+               WHERE user_id = ? AND session_id = ? AND branch_id = ?
+               ORDER BY timestamp""",
+            (user_id, session_id, branch_id)
+        ).fetchall()
+        ids, actions, models, tools, tokens, durations = zip(*rows) if rows else ((),) * 6
+        return {
+            "id": array("q", ids),
+            "action_type": list(actions),
+            "model": list(models),
+            "tool": list(tools),
+            "total_tokens": list(tokens),
+            "duration_ms": array("q", (d or 0 for d in durations)),
+        }
+
     def get_path_to_root(self, user_id: str, session_id: str, node_id: int) -> List[ExecutionNode]:
         path = []
         current_id: Optional[int] = node_id
@@ -92,143 +351,230 @@ class DagStore:
             if not node:
                 break
             path.append(node)
-            current_id = int(node.parent_id) if node.parent_id else None
+            current_id = node.parent_id
         return list(reversed(path))
 
+    def get_path_ids_to_root(self, user_id: str, session_id: str, node_id: int) -> array:
+        """Node ids from root to node_id in one query, without hydrating nodes.
+
+        Parent links are followed across the user's sessions, so a branch forked
+        from another session's node includes that session's ancestors.
+        """
+        rows = self._reader().execute(
+            """WITH RECURSIVE path(id, parent_id, depth) AS (
+                   SELECT id, parent_id, 0 FROM nodes
+                   WHERE user_id = ? AND session_id = ? AND id = ?
+                   UNION ALL
+                   SELECT n.id, n.parent_id, p.depth + 1 FROM nodes n
+                   JOIN path p ON n.id = p.parent_id
+                   WHERE n.user_id = ?
+               )
+               SELECT id FROM path ORDER BY depth DESC""",
+            (user_id, session_id, node_id, user_id),
+        ).fetchall()
+        return array("q", (row[0] for row in rows))
+
     # ─── Branches ─────────────────────────────────────────────────
 
     def insert_branch(self, user_id: str, session_id: str, branch: Branch) -> int:
         """Insert branch and return the auto-generated branch_id."""
-        cursor = self.conn.execute(
-            """INSERT INTO branches (
-                user_id, session_id, name, head_node_id, base_node_id, status, intent,
-                status_reason, created_by, created_at, tokens_used, time_elapsed_seconds
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                user_id,
-                session_id,
-                branch.name,
-                int(branch.head_node_id) if branch.head_node_id else None,
-                int(branch.base_node_id) if branch.base_node_id else None,
-                branch.status.value,
-                branch.intent,
-                getattr(branch, 'status_reason', None),
-                branch.created_by.value,
-                int(branch.created_at.timestamp()),
-                branch.tokens_used,
-                branch.time_elapsed_seconds,
-            ),
-        )
-        self.conn.commit()
-        return cursor.lastrowid
+        with self._write_lock:
+            cursor = self.conn.execute(
+                _INSERT_BRANCH,
+                (
+                    user_id,
+                    session_id,
+                    branch.name,
+                    branch.head_node_id,
+                    branch.base_node_id,
+                    branch.status.value,
+                    branch.intent,
+                    branch.status_reason,
+                    branch.created_by.value,
+                    int(branch.created_at.timestamp()),
+                    branch.tokens_used,
+                    branch.time_elapsed_seconds,
+                ),
+            )
+            self._commit()
+            self._active_branches.pop((user_id, session_id), None)
+            self._branches.pop((user_id, session_id, branch.name), None)
+            return cursor.lastrowid
 
     def get_branch(self, user_id: str, session_id: str, name: str) -> Optional[Branch]:
-        row = self.conn.execute(
-            "SELECT * FROM branches WHERE user_id = ? AND session_id = ? AND name = ?",
-            (user_id, session_id, name)
-        ).fetchone()
-        return self._row_to_branch(row) if row else None
+        """Get a branch by name. Cached until the branch is next written."""
+        with self._write_lock:
+            key = (user_id, session_id, name)
+            branch = self._branches.get(key)
+            if branch is not None:
+                return branch
+            row = self.conn.execute(
+                f"SELECT {_BRANCH_COLUMNS} FROM branches WHERE user_id = ? AND session_id = ? AND name = ?",
+                (user_id, session_id, name)
+            ).fetchone()
+            if not row:
+                return None
+            branch = self._row_to_branch(row)
+            self._branches[key] = branch
+            self._branch_keys[branch.branch_id] = key
+            return branch
+
+    def _forget_branch(self, branch_id: int):
+        """Drop a branch's by-name cache entry after it is written."""
+        key = self._branch_keys.pop(branch_id, None)
+        if key:
+            self._branches.pop(key, None)
 
     def get_branch_by_id(self, branch_id: int) -> Optional[Branch]:
         """Get branch by its integer ID."""
-        row = self.conn.execute(
-            "SELECT * FROM branches WHERE branch_id = ?", (branch_id,)
-        ).fetchone()
-        return self._row_to_branch(row) if row else None
+        with self._write_lock:
+            row = self.conn.execute(
+                f"SELECT {_BRANCH_COLUMNS} FROM branches WHERE branch_id = ?", (branch_id,)
+            ).fetchone()
+            return self._row_to_branch(row) if row else None
 
     def list_branches(self, user_id: str, session_id: str, status: Optional[BranchStatus] = None) -> List[Branch]:
-        if status:
-            rows = self.conn.execute(
-                """SELECT * FROM branches WHERE user_id = ? AND session_id = ? AND status = ? 
-                   ORDER BY created_at""",
-                (user_id, session_id, status.value),
-            ).fetchall()
-        else:
-            rows = self.conn.execute(
-                "SELECT * FROM branches WHERE user_id = ? AND session_id = ? ORDER BY created_at",
-                (user_id, session_id)
-            ).fetchall()
-        return [self._row_to_branch(r) for r in rows]
-    
+        with self._write_lock:
+            if status:
+                rows = self.conn.execute(
+                    f"""SELECT {_BRANCH_COLUMNS} FROM branches WHERE user_id = ? AND session_id = ? AND status = ? 
+                       ORDER BY created_at""",
+                    (user_id, session_id, status.value),
+                ).fetchall()
+            else:
+                rows = self.conn.execute(
+                    f"SELECT {_BRANCH_COLUMNS} FROM branches WHERE user_id = ? AND session_id = ? ORDER BY created_at",
+                    (user_id, session_id)
+                ).fetchall()
+            return [self._row_to_branch(r) for r in rows]
+
     def get_active_branch(self, user_id: str, session_id: str) -> Optional[Branch]:
-        """Get the active branch for a session (status='active')."""
-        row = self.conn.execute(
-            """SELECT * FROM branches WHERE user_id = ? AND session_id = ? AND status = ? 
-               ORDER BY created_at DESC LIMIT 1""",
-            (user_id, session_id, BranchStatus.ACTIVE.value)
-        ).fetchone()
-        return self._row_to_branch(row) if row else None
+        """Get the active branch for a session (status='active'). Cached per session."""
+        with self._write_lock:
+            key = (user_id, session_id)
+            if key in self._active_branches:
+                return self._active_branches[key]
+            row = self.conn.execute(
+                _SELECT_ACTIVE_BRANCH, (user_id, session_id, BranchStatus.ACTIVE.value)
+            ).fetchone()
+            branch = self._row_to_branch(row) if row else None
+            self._active_branches[key] = branch
+            return branch
 
     def update_branch_head(self, user_id: str, session_id: str, branch_id: int, new_head_id: int):
         """Update branch head."""
-        self.conn.execute(
-            """UPDATE branches SET head_node_id = ? 
-               WHERE user_id = ? AND session_id = ? AND branch_id = ?""",
-            (new_head_id, user_id, session_id, branch_id),
-        )
-        self.conn.commit()
+        with self._write_lock:
+            self.conn.execute(
+                _UPDATE_BRANCH_HEAD,
+                (new_head_id, user_id, session_id, branch_id),
+            )
+            self._commit()
+            self._forget_branch(branch_id)
+            key = (user_id, session_id)
+            active = self._active_branches.get(key)
+            if active and active.branch_id == branch_id:
+                self._active_branches[key] = replace(active, head_node_id=new_head_id)
 
     def update_branch_status(self, user_id: str, session_id: str, branch_id: int, status: BranchStatus, reason: Optional[str] = None):
         """Update branch status and optional status_reason."""
-        self.conn.execute(
-            """UPDATE branches SET status = ?, status_reason = ? 
-               WHERE user_id = ? AND session_id = ? AND branch_id = ?""",
-            (status.value, reason, user_id, session_id, branch_id),
-        )
-        self.conn.commit()
+        with self._write_lock:
+            self.conn.execute(
+                _UPDATE_BRANCH_STATUS,
+                (status.value, reason, user_id, session_id, branch_id),
+            )
+            self._commit()
+            self._active_branches.pop((user_id, session_id), None)
+            self._forget_branch(branch_id)
 
     # ─── Checkpoints ──────────────────────────────────────────────
 
     def insert_checkpoint(self, checkpoint: Checkpoint, node_id: int):
-        """Insert a checkpoint linked to a node."""
-        self.conn.execute(
-            """INSERT INTO checkpoints (
-                hash, node_id, filesystem_ref, files_changed,
-                memory, history, created_at, compressed, size_bytes
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                checkpoint.hash,
-                node_id,
-                checkpoint.filesystem_ref,
-                json.dumps(checkpoint.files_changed),
-                json.dumps(checkpoint.agent_memory),
-                json.dumps(checkpoint.conversation_history),
-                int(checkpoint.created_at.timestamp()),
-                1 if checkpoint.compressed else 0,
-                checkpoint.size_bytes,
-            ),
-        )
-        self.conn.commit()
+        """Insert a checkpoint linked to a node. Compressed checkpoints store zlib payloads.
+
+        Sets checkpoint.size_bytes to the size of the payloads as stored, i.e.
+        after compression.
+
+        Re-recording a checkpoint whose row already exists with the same files
+        and state keeps the existing row; a different row under the same hash
+        is a hash collision and raises sqlite3.IntegrityError.
+        """
+        if checkpoint.compressed:
+            memory = zlib.compress(_json_dumps(checkpoint.agent_memory).encode(), 1)
+            history = _compress_json_list(checkpoint.conversation_history)
+            checkpoint.size_bytes = len(memory) + len(history)
+        else:
+            memory = _json_dumps(checkpoint.agent_memory)
+            history = _json_dumps(checkpoint.conversation_history)
+            checkpoint.size_bytes = len(memory.encode()) + len(history.encode())
+        with self._write_lock:
+            try:
+                self.conn.execute(
+                    _INSERT_CHECKPOINT,
+                    (
+                        checkpoint.hash,
+                        node_id,
+                        checkpoint.filesystem_ref,
+                        _json_dumps(checkpoint.files_changed),
+                        memory,
+                        history,
+                        int(checkpoint.created_at.timestamp()),
+                        1 if checkpoint.compressed else 0,
+                        checkpoint.size_bytes,
+                    ),
+                )
+            except sqlite3.IntegrityError:
+                existing = self.conn.execute(
+                    "SELECT filesystem_ref, memory, history FROM checkpoints WHERE hash = ?",
+                    (checkpoint.hash,),
+                ).fetchone()
+                if existing != (checkpoint.filesystem_ref, memory, history):
+                    raise
+            self._commit()
 
     def get_checkpoint(self, hash: str) -> Optional[tuple]:
-        """Get checkpoint by hash. Returns row data."""
-        row = self.conn.execute(
-            "SELECT * FROM checkpoints WHERE hash = ?", (hash,)
+        """Get checkpoint by hash. Returns row data (without memory/history payloads)."""
+        row = self._reader().execute(
+            f"SELECT {_CHECKPOINT_COLUMNS} FROM checkpoints WHERE hash = ?", (hash,)
         ).fetchone()
         return row
 
+    def get_checkpoint_state(self, hash: str) -> Optional[Tuple[dict, list]]:
+        """Load a checkpoint's (agent_memory, conversation_history), decompressing if needed."""
+        row = self._reader().execute(
+            "SELECT memory, history, compressed FROM checkpoints WHERE hash = ?", (hash,)
+        ).fetchone()
+        if not row:
+            return None
+        memory, history, compressed = row
+        if compressed:
+            memory, history = zlib.decompress(memory), zlib.decompress(history)
+        return json.loads(memory), json.loads(history)
+
     def get_checkpoint_nodes(self, user_id: str, session_id: str) -> List[ExecutionNode]:
         """All CHECKPOINT action type nodes for a session, most recent first."""
-        rows = self.conn.execute(
-            """SELECT * FROM nodes WHERE user_id = ? AND session_id = ? AND action_type = ? 
-               ORDER BY timestamp DESC""",
+        rows = self._reader().execute(
+            f"""SELECT {_NODE_COLUMNS} FROM nodes WHERE user_id = ? AND session_id = ? AND action_type = ? 
+               ORDER BY timestamp DESC, id DESC""",
             (user_id, session_id, "checkpoint"),
         ).fetchall()
         return [self._row_to_node(r) for r in rows]
     
     def get_latest_checkpoint(self, user_id: str, session_id: str) -> Optional[ExecutionNode]:
-        """Get most recent checkpoint node for this session (for parent SHA tracking)."""
-        row = self.conn.execute(
-            """SELECT * FROM nodes WHERE user_id = ? AND session_id = ? AND checkpoint_sha IS NOT NULL 
-               ORDER BY timestamp DESC LIMIT 1""",
+        """Get most recent checkpoint node for this session (for parent SHA tracking).
+
+        Timestamps have one-second resolution, so ties go to the later insert.
+        """
+        row = self._reader().execute(
+            f"""SELECT {_NODE_COLUMNS} FROM nodes WHERE user_id = ? AND session_id = ? AND checkpoint_sha IS NOT NULL 
+               ORDER BY timestamp DESC, id DESC LIMIT 1""",
             (user_id, session_id)
         ).fetchone()
         return self._row_to_node(row) if row else None
 
     def list_checkpoints(self) -> List[tuple]:
         """List all checkpoints, most recent first."""
-        rows = self.conn.execute(
-            "SELECT * FROM checkpoints ORDER BY created_at DESC"
+        rows = self._reader().execute(
+            f"SELECT {_CHECKPOINT_COLUMNS} FROM checkpoints ORDER BY created_at DESC"
         ).fetchall()
         return rows
 
@@ -251,8 +597,8 @@ class DagStore:
         return ExecutionNode(
             user_id=user_id,
             session_id=session_id,
-            id=str(row[0]),
-            parent_id=str(row[1]) if row[1] else None,
+            id=row[0],
+            parent_id=row[1],
             checkpoint_sha=row[5],
             action_type=ActionType(row[6]),
             content=json.loads(row[7]),
@@ -277,16 +623,14 @@ class DagStore:
             user_id=row[2],
             session_id=row[3],
             name=row[1],
-            head_node_id=str(row[4]) if row[4] else None,
-            base_node_id=str(row[5]) if row[5] else None,
+            head_node_id=row[4],
+            base_node_id=row[5],
             status=BranchStatus(row[6]),
             intent=row[7] or "",
             created_by=CallerType(row[9]),
             created_at=datetime.fromtimestamp(row[10]),
             tokens_used=row[11] or 0,
             time_elapsed_seconds=row[12] or 0.0,
+            status_reason=row[8],
         )
-        # Add status_reason as a dynamic attribute if needed
-        if row[8]:  # status_reason
-            setattr(branch, 'status_reason', row[8])
         return branch
\ No newline at end of file
@@ -1,7 +1,35 @@
+import hashlib
+import json
 import os
+import stat
 import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple, Union
+
+# Directory names never snapshotted, and file suffixes skipped anywhere
+IGNORE_DIRS = frozenset({'.agentgit', '.git', '__pycache__', 'node_modules'})
+IGNORE_SUFFIXES = ('.pyc', '.DS_Store')
+# The same rules in gitignore syntax, written to the snapshot repo's
+# info/exclude so `ls-files --exclude-standard` filters them inside git
+_EXCLUDE_MARKER = "# agentgit snapshot excludes"
+_EXCLUDE_RULES = "\n".join(
+    [_EXCLUDE_MARKER, *(f"{d}/" for d in sorted(IGNORE_DIRS)), *(f"*{s}" for s in IGNORE_SUFFIXES)]
+) + "\n"
+
+# Workspaces larger than this are hashed by several hash-object processes in parallel
+BLOB_SHARD_SIZE = 512
+# Caps concurrent git subprocesses across threads so large snapshots can't exhaust fds
+_GIT_PROCESS_SLOTS = threading.BoundedSemaphore(64)
+# Git's well-known SHA of the empty tree; git resolves it without the object existing
+EMPTY_TREE_SHA = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+# Most recent snapshot file listings kept by get_snapshot_files
+SNAPSHOT_FILES_CACHE_SIZE = 256
+# Most recently built trees remembered by _build_tree
+TREE_CACHE_SIZE = 256
+
 
 class GitBackend:
     """
@@ -12,8 +40,35 @@ class GitBackend:
 
     def __init__(self, git_dir: Path):
         self.git_dir = git_dir
+        # commit SHA -> tree SHA for snapshots made by this process
+        self._commit_trees: dict[str, str] = {}
+        # Subprocess environments built once; per-call values are merged on top.
+        # commit-tree needs author/committer identity; set it explicitly
+        # so the snapshot repo works regardless of the user's git config.
+        self._commit_env = {
+            **os.environ,
+            "GIT_AUTHOR_NAME": "AgentGit",
+            "GIT_AUTHOR_EMAIL": "agentgit@snapshot",
+            "GIT_COMMITTER_NAME": "AgentGit",
+            "GIT_COMMITTER_EMAIL": "agentgit@snapshot",
+        }
+        self._index_env_base = dict(os.environ)
+        self._restore_env_base = {**os.environ, "GIT_DIR": str(git_dir)}
         if not (git_dir/ "HEAD").exists():
             self._init_bare_repo()
+        self._ensure_excludes()
+        # workspace -> {relative path -> (mtime_ns, size, blob SHA)}, so files
+        # whose stat is unchanged since they were last hashed are not hashed again
+        self._hash_cache_path = git_dir / "hash_cache.json"
+        # mtime of the cache file when last loaded or saved; see _scan_workspace
+        self._cache_written_ns = 0
+        self._hash_cache: dict[str, dict[str, tuple[int, int, str]]] = self._load_hash_cache()
+        # digest of a tree's full entry listing -> tree SHA, least recently
+        # used first; an unchanged workspace then rebuilds its tree without
+        # running git at all
+        self._tree_cache: dict[bytes, str] = {}
+        # commit SHA -> file list; a commit's contents never change
+        self._snapshot_files: dict[str, List[str]] = {}
     
     def _init_bare_repo(self):
         subprocess.run(
@@ -22,54 +77,147 @@ class GitBackend:
             capture_output=True,
         )
 
-    def _create_blob(self, file_path: Path) -> str:
-        """Hash a file and store it in the object database."""
-        return self._run(["hash-object", "-w", str(file_path)]).stdout.strip()
+    def _create_blobs_batch(self, paths: List[str]) -> List[str]:
+        """Hash and store many files with one `hash-object --stdin-paths` process.
+
+        Returns blob SHAs in the same order as ``paths``. --stdin-paths reads
+        one path per line and C-unquotes a leading '"', so paths containing a
+        newline or starting with a quote are hashed one process each instead.
+        """
+        if not paths:
+            return []
+        awkward = {i for i, path in enumerate(paths) if "\n" in path or path.startswith('"')}
+        batch = [path for i, path in enumerate(paths) if i not in awkward] if awkward else paths
+        shas = []
+        if batch:
+            result = self._run(
+                ["hash-object", "-w", "--stdin-paths"],
+                stdin=b"".join(os.fsencode(path) + b"\n" for path in batch),
+                text=False,
+            )
+            shas = result.stdout.decode().split()
+            if len(shas) != len(batch):
+                raise RuntimeError(
+                    f"git hash-object returned {len(shas)} SHAs for {len(batch)} paths"
+                )
+        if not awkward:
+            return shas
+        batch_shas = iter(shas)
+        return [
+            self._run(["hash-object", "-w", "--", path]).stdout.strip()
+            if i in awkward else next(batch_shas)
+            for i, path in enumerate(paths)
+        ]
+
+    def _create_blobs(self, paths: List[str]) -> List[str]:
+        """Hash and store files, sharding large workspaces across parallel processes."""
+        if len(paths) <= BLOB_SHARD_SIZE:
+            return self._create_blobs_batch(paths)
+        shards = min(os.cpu_count() or 1, -(-len(paths) // BLOB_SHARD_SIZE))
+        size = -(-len(paths) // shards)
+        chunks = [paths[i:i + size] for i in range(0, len(paths), size)]
+        with ThreadPoolExecutor(max_workers=len(chunks)) as pool:
+            return [sha for shas in pool.map(self._create_blobs_batch, chunks) for sha in shas]
+
+    def _ensure_excludes(self):
+        """Add the snapshot ignore rules to info/exclude (also for repos made by older versions)."""
+        exclude = self.git_dir / "info" / "exclude"
+        try:
+            current = exclude.read_text()
+        except OSError:
+            current = ""
+        if _EXCLUDE_MARKER not in current:
+            exclude.parent.mkdir(parents=True, exist_ok=True)
+            with open(exclude, "a") as f:
+                if current and not current.endswith("\n"):
+                    f.write("\n")
+                f.write(_EXCLUDE_RULES)
+
+    def _load_hash_cache(self) -> dict[str, dict[str, tuple[int, int, str]]]:
+        try:
+            with open(self._hash_cache_path) as f:
+                written_ns = os.fstat(f.fileno()).st_mtime_ns
+                cache = {
+                    workspace: {rel: tuple(entry) for rel, entry in entries.items()}
+                    for workspace, entries in json.load(f).items()
+                }
+        except (OSError, ValueError, AttributeError):
+            # AttributeError: a flat cache from an older version; rehash once
+            return {}
+        self._cache_written_ns = written_ns
+        return cache
+
+    def _save_hash_cache(self):
+        # A uniquely named temp file, so concurrent savers never write into
+        # each other's file before the atomic replace
+        with tempfile.NamedTemporaryFile(
+            "w", dir=self.git_dir, prefix="hash_cache.", suffix=".tmp", delete=False
+        ) as f:
+            try:
+                json.dump(self._hash_cache, f, separators=(",", ":"))
+            except BaseException:
+                f.close()
+                os.unlink(f.name)
+                raise
+        os.replace(f.name, self._hash_cache_path)
+        self._cache_written_ns = os.stat(self._hash_cache_path).st_mtime_ns
 
     def _run(
         self,
         args: List[str],
-        stdin: Optional[str] = None,
+        stdin: Optional[Union[str, bytes]] = None,
         env: Optional[dict] = None,
+        text: bool = True,
     ) -> subprocess.CompletedProcess:
-        """Run a git plumbing command against the bare snapshot repo."""
-        return subprocess.run(
-            ["git", "--git-dir", str(self.git_dir)] + args,
-            input=stdin,
-            capture_output=True,
-            text=True,
-            check=True,
-            env=env,
-        )
-
-    def _write_tree(self, tree_dict: dict):
-        """Recursively build git tree objects from nested dict structure."""
-        lines: List[str] = []
-        for name, value in sorted(tree_dict.items()):  # Sort for consistent tree hashing
-            if isinstance(value, str):
-                # It's a blob SHA
-                lines.append(f"100644 blob {value}\t{name}")
-            else:
-                # It's a subtree
-                sub_sha = self._write_tree(value)
-                lines.append(f"040000 tree {sub_sha}\t{name}")
-        
-        tree_input = "\n".join(lines) + "\n" if lines else ""
-        result = self._run(["mktree"], stdin=tree_input)
-        return result.stdout.strip()
+        """Run a git plumbing command against the bare snapshot repo.
 
+        With text=False stdin and stdout are bytes, for input or output holding
+        raw paths.
+        """
+        with _GIT_PROCESS_SLOTS:
+            return subprocess.run(
+                ["git", "--git-dir", str(self.git_dir)] + args,
+                input=stdin,
+                capture_output=True,
+                text=text,
+                check=True,
+                env=env,
+            )
 
     def _build_tree(self, blob_shas: dict[str, str]) -> str:
-        """Build a git tree from {relative_path: blob_sha}."""
-        # Nest into a dict:  {"dir": {"sub": {"file.py": "<sha>"}}}
-        root: dict = {}
-        for path, sha in blob_shas.items():
-            parts = Path(path).parts
-            node = root
-            for part in parts[:-1]:
-                node = node.setdefault(part, {})
-            node[parts[-1]] = sha
-        return self._write_tree(root)
+        """Build a git tree from {relative_path: blob_sha}.
+
+        All entries are streamed into a scratch index with one update-index call
+        and write-tree emits every subtree at once, instead of one mktree
+        process per directory.
+        """
+        if not blob_shas:
+            return EMPTY_TREE_SHA
+        # Entries arrive in the listing's (sorted) order, so the digest is stable
+        # without re-sorting; update-index itself doesn't need sorted input
+        index_info = b"".join(
+            b"100644 %s\t%s\0" % (sha.encode(), os.fsencode(path)) for path, sha in blob_shas.items()
+        )
+        key = hashlib.blake2b(index_info, digest_size=16).digest()
+        tree_sha = self._tree_cache.pop(key, None)
+        if tree_sha is not None:
+            self._tree_cache[key] = tree_sha  # move to the most recent end
+            return tree_sha
+
+        index_file = self.git_dir / f"index_snapshot_{os.getpid()}_{threading.get_ident()}"
+        index_file.unlink(missing_ok=True)
+        env = self._index_env_base | {"GIT_INDEX_FILE": str(index_file)}
+        try:
+            self._run(
+                ["update-index", "--add", "-z", "--index-info"], stdin=index_info, env=env, text=False
+            )
+            tree_sha = self._run(["write-tree"], env=env).stdout.strip()
+        finally:
+            index_file.unlink(missing_ok=True)
+        if len(self._tree_cache) >= TREE_CACHE_SIZE:
+            del self._tree_cache[next(iter(self._tree_cache))]
+        self._tree_cache[key] = tree_sha
+        return tree_sha
 
     # _get_last_snapshot and _set_last_snapshot removed (stateless)
 
@@ -77,86 +225,222 @@ class GitBackend:
         cmd = ["commit-tree", tree_sha, "-m", message]
         if parent:
             cmd.extend(["-p", parent])
-        # commit-tree needs author/committer identity; set it explicitly
-        # so the snapshot repo works regardless of the user's git config.
-        env = {
-            **os.environ,
-            "GIT_AUTHOR_NAME": "AgentGit",
-            "GIT_AUTHOR_EMAIL": "agentgit@snapshot",
-            "GIT_COMMITTER_NAME": "AgentGit",
-            "GIT_COMMITTER_EMAIL": "agentgit@snapshot",
-        }
-        return self._run(cmd, env=env).stdout.strip()
+        return self._run(cmd, env=self._commit_env).stdout.strip()
+
+    def _scan_workspace(
+        self, workspace: Path, entries: dict[str, tuple[int, int, str]]
+    ) -> tuple[dict[str, str], list[tuple[str, str, tuple[int, int]]]]:
+        """Split tracked files into {rel: blob_sha} in listing order and stale
+        (path, rel, stat) entries, whose SHA in the map is left empty. Cached
+        SHAs come from ``entries``, the workspace's hash cache.
+
+        Only paths that resolve to regular files are kept, whichever way they
+        were listed: dangling symlinks and symlinks to directories are skipped.
+
+        Like git's racy-clean check, a cached SHA is only trusted for a file
+        last modified before the cache was written: a file rewritten within
+        the same timestamp tick as its hashing keeps its (mtime, size) stamp,
+        so it is hashed again.
+        """
+        written_ns = self._cache_written_ns
+        base = str(workspace)
+        blob_shas: dict[str, str] = {}
+        stale: list[tuple[str, str, tuple[int, int]]] = []
+        for rel in self._get_tracked_files(workspace):
+            key = os.path.join(base, rel)
+            try:
+                st = os.stat(key)
+            except OSError:
+                continue  # dangling symlink, or removed since it was listed
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            stamp = (st.st_mtime_ns, st.st_size)
+            entry = entries.get(rel)
+            if entry is not None and entry[:2] == stamp and stamp[0] < written_ns:
+                blob_shas[rel] = entry[2]
+            else:
+                blob_shas[rel] = ""  # filled in once hashed; keeps listing order
+                stale.append((key, rel, stamp))
+        return blob_shas, stale
 
     def create_commit(self, workspace: Path, parent_sha: Optional[str], message: str) -> str:
         """Create a commit from the workspace state. Parent SHA provided by caller."""
-        blob_shas: dict[str, str] = {}
-        for path in self._get_tracked_files(workspace):
-            rel = str(path.relative_to(workspace))
-            blob_shas[rel] = self._create_blob(path)
-        
+        base = str(workspace)
+        entries = self._hash_cache.get(base, {})
+        blob_shas, stale = self._scan_workspace(workspace, entries)
+        # Keep only files this scan saw, so deleted and renamed files drop out
+        seen = {rel: entries[rel] for rel, sha in blob_shas.items() if sha}
+        if stale:
+            # A few git processes for every changed file instead of a fork/exec per file
+            shas = self._create_blobs([path for path, _, _ in stale])
+            for (_, rel, stamp), sha in zip(stale, shas):
+                blob_shas[rel] = sha
+                seen[rel] = (*stamp, sha)
+        if stale or len(seen) != len(entries):
+            self._hash_cache[base] = seen
+            self._save_hash_cache()
+
         tree_sha = self._build_tree(blob_shas)
+        # Nothing changed since the parent snapshot: reuse it rather than
+        # chaining an empty commit
+        if parent_sha and self._commit_trees.get(parent_sha) == tree_sha:
+            return parent_sha
         commit_sha = self._create_commit(tree_sha, message, parent_sha)
+        self._commit_trees[commit_sha] = tree_sha
         return commit_sha
     
+    def _workspace_index(self, workspace: Path) -> Path:
+        """Long-lived index file recording what was last restored into a workspace."""
+        key = hashlib.blake2b(str(workspace.resolve()).encode(), digest_size=8).hexdigest()
+        return self.git_dir / f"index_{key}"
+
     def restore_commit(self, commit_sha: str, workspace: Path):
-        """Restore a commit to the specified workspace."""
-        # 1. Read tree into index (using a temporary index file to avoid locking issues if possible, 
-        # but for now we'll use the default index with GIT_WORK_TREE)
-        
-        # We need to be careful about index locking if multiple sessions run in parallel.
-        # For a robust stateless implementation, we should probably use a temporary index file per operation.
-        index_file = self.git_dir / f"index_{os.getpid()}_{id(workspace)}"
-        
-        env = {
-            **os.environ,
-            "GIT_DIR": str(self.git_dir),
+        """Restore a commit to the specified workspace.
+
+        Each workspace keeps its own index across restores, so `read-tree --reset -u`
+        only writes files that differ from the previous restore or were changed
+        on disk since, and removes files the previous restore wrote that the
+        target lacks. Files edited since the previous restore are never removed:
+        they are dropped from the index first, so git treats them as untracked.
+        The first restore into a workspace writes every file, in parallel for
+        large trees.
+        """
+        index = self._workspace_index(workspace)
+        env = self._restore_env_base | {
             "GIT_WORK_TREE": str(workspace),
-            "GIT_INDEX_FILE": str(index_file),
+            "GIT_INDEX_FILE": str(index),
         }
-        
-        self._run(["read-tree", commit_sha], env=env)
-        
-        subprocess.run(
-            ["git", "checkout-index", "-a", "-f"],
-            env=env,
-            cwd=workspace,
-            check=True,
-            capture_output=True,
-            text=True,
-        )
-        
-        # Cleanup temp index
-        if index_file.exists():
-            index_file.unlink()
+        if index.exists():
+            self._forget_edited_files(commit_sha, env)
+        # checkout.workers=0: large updates are written by one worker per core
+        # (git only goes parallel past checkout.thresholdForParallelism files)
+        self._run(["-c", "checkout.workers=0", "read-tree", "--reset", "-u", commit_sha], env=env)
+
+    def _forget_edited_files(self, commit_sha: str, env: dict):
+        """Drop files edited since the last restore, and absent from the target,
+        from the workspace index so that `read-tree --reset -u` leaves them on disk.
+
+        Edited files the target does contain stay indexed and are overwritten,
+        as a restore always has.
+        """
+        self._run(["update-index", "-q", "--refresh"], env=env)
+        result = self._run(["diff-files", "--name-only", "-z"], env=env, text=False)
+        edited = [os.fsdecode(rel) for rel in result.stdout.split(b"\0")[:-1]]
+        if not edited:
+            return
+        in_target = set(self.get_snapshot_files(commit_sha))
+        forget = [rel for rel in edited if rel not in in_target]
+        if forget:
+            self._run(
+                ["update-index", "--force-remove", "-z", "--stdin"],
+                stdin=b"".join(os.fsencode(rel) + b"\0" for rel in forget),
+                env=env,
+                text=False,
+            )
+
+    def diff_commits(self, commit_a: str, commit_b: str) -> List[Tuple[str, str]]:
+        """(status, path) for every file that differs between two snapshots.
+
+        Status is git's name-status letter: A added, M modified, D deleted, T type change.
+        """
+        fields = self._run(
+            ["diff-tree", "-r", "--name-status", "-z", commit_a, commit_b]
+        ).stdout.split("\0")
+        return list(zip(fields[0:-1:2], fields[1::2]))
 
     def get_snapshot_files(self, commit_sha: str) -> List[str]:
         """Return the list of file paths recorded in a snapshot."""
-        result = self._run(["ls-tree", "-r", "--name-only", commit_sha])
-        text = result.stdout.strip()
-        return text.split("\n") if text else []
+        files = self._snapshot_files.get(commit_sha)
+        if files is None:
+            # NUL-separated, so paths with spaces, quotes or non-ASCII come back
+            # unquoted; decoded like os.listdir, so non-UTF-8 names round-trip
+            result = self._run(["ls-tree", "-r", "--name-only", "-z", commit_sha], text=False)
+            files = [os.fsdecode(path) for path in result.stdout.split(b"\0")[:-1]]
+            if len(self._snapshot_files) >= SNAPSHOT_FILES_CACHE_SIZE:
+                del self._snapshot_files[next(iter(self._snapshot_files))]
+            self._snapshot_files[commit_sha] = files
+        return list(files)
     
-    def _get_tracked_files(self, workspace: Path) -> List[Path]:
-        """Get all files in the workspace (excluding .agentgit and common ignores)."""
+    def iter_snapshot_files(self, commit_sha: str) -> Iterator[str]:
+        """Yield the file paths recorded in a snapshot as git lists them.
+
+        Reads ls-tree's output incrementally, so huge snapshots are never held
+        in memory as one string or list. The process slot is only held while
+        spawning git, never across a yield, so a generator left suspended can't
+        starve other git calls; close it (or exhaust it) to reap the process.
+        """
+        with _GIT_PROCESS_SLOTS:
+            proc = subprocess.Popen(
+                ["git", "--git-dir", str(self.git_dir), "ls-tree", "-r", "--name-only", "-z", commit_sha],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=1 << 16,
+            )
+        try:
+            pending = b""
+            while chunk := proc.stdout.read1(1 << 16):
+                *paths, pending = (pending + chunk).split(b"\0")
+                for path in paths:
+                    yield os.fsdecode(path)
+        except GeneratorExit:
+            proc.kill()  # caller stopped early; discard the rest
+            raise
+        finally:
+            proc.stdout.close()
+            proc.wait()
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, proc.args)
+
+    def _get_tracked_files(self, workspace: Path) -> List[str]:
+        """Get all files in the workspace (excluding .agentgit and common ignores),
+        as workspace-relative posix paths.
+
+        git lists them in one `ls-files` call, applying info/exclude and any
+        .gitignore files in the workspace; the Python walk is the fallback.
+        Names are decoded with os.fsdecode, as os.walk does, so names that are
+        not valid UTF-8 round-trip to the filesystem.
+        """
+        try:
+            result = self._run(
+                ["--work-tree", str(workspace), "ls-files", "-co", "--exclude-standard", "-z"],
+                text=False,
+            )
+        except (OSError, subprocess.CalledProcessError):
+            return self._walk_files(workspace)
+        # A snapshot repo inside the workspace under a non-ignored name
+        git_prefix = None
+        if self.git_dir.is_relative_to(workspace):
+            git_prefix = self.git_dir.relative_to(workspace).as_posix() + "/"
         tracked = []
-        ignore_patterns = {'.agentgit', '.git', '__pycache__', 'node_modules'}
-        ignore_suffixes = {'.pyc', '.DS_Store'}
-        
-        for path in workspace.rglob('*'):
-            if path.is_file():
-                # Skip if path is inside git_dir (if git_dir is inside workspace)
-                try:
-                    path.relative_to(self.git_dir)
-                    continue
-                except ValueError:
-                    pass
-                
-                if any(pattern in path.parts for pattern in ignore_patterns):
-                    continue
-                
-                if any(str(path).endswith(suffix) for suffix in ignore_suffixes):
-                    continue
-                    
-                tracked.append(path)
-        
-        return tracked
\ No newline at end of file
+        for rel in map(os.fsdecode, result.stdout.split(b"\0")):
+            if not rel or (git_prefix and rel.startswith(git_prefix)):
+                continue
+            if rel.endswith("/"):
+                # A nested git repository is listed as one directory entry;
+                # walk it so its files are snapshotted like any others
+                tracked.extend(self._walk_files(workspace, rel[:-1]))
+            else:
+                tracked.append(rel)
+        return tracked
+
+    def _walk_files(self, workspace: Path, subdir: str = "") -> List[str]:
+        """Walk the workspace (or one subdirectory of it) in Python, applying
+        IGNORE_DIRS and IGNORE_SUFFIXES. Paths are relative to the workspace."""
+        tracked = []
+        git_dir = str(self.git_dir)
+        # Prune ignored directories before descending, so their contents are
+        # never listed. Only names below the workspace are checked, so a
+        # workspace that itself lives under .agentgit/ is still walked.
+        for root, dirs, files in os.walk(os.path.join(workspace, subdir)):
+            dirs[:] = [
+                d for d in dirs
+                if d not in IGNORE_DIRS and os.path.join(root, d) != git_dir
+            ]
+            # Relative prefix is worked out once per directory, not per file
+            rel_root = os.path.relpath(root, workspace)
+            prefix = "" if rel_root == "." else rel_root.replace(os.sep, "/") + "/"
+            for name in files:
+                if not name.endswith(IGNORE_SUFFIXES):
+                    tracked.append(prefix + name)
+
+        # Same order git would list them in (byte order of the path)
+        tracked.sort()
+        return tracked
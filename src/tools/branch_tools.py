@@ -1,6 +1,6 @@
 from typing import Optional, List
 from datetime import datetime
-from models.dag import Branch, BranchStatus, CallerType
+from ..models.dag import Branch, BranchStatus, CallerType
 
 
 class BranchTools:
@@ -44,7 +44,7 @@ class BranchTools:
         if base_node is None:
             active_branch = self.ag.get_active_branch(user_id, session_id)
             if active_branch:
-                base_node = int(active_branch.head_node_id) if active_branch.head_node_id else None
+                base_node = active_branch.head_node_id
 
         return self.ag.create_branch(
             user_id=user_id,
@@ -70,17 +70,19 @@ class BranchTools:
         if not branch:
             return False
 
-        # Mark current active branch as not active (if any)
         current_active = self.ag.get_active_branch(user_id, session_id)
-        if current_active and current_active.branch_id != branch.branch_id:
+        if current_active and current_active.branch_id == branch.branch_id:
+            return True  # Already active: nothing to write
+
+        # Deactivate the current branch and activate the target in one commit
+        with self.ag.transaction():
+            if current_active:
+                self.ag.dag_store.update_branch_status(
+                    user_id, session_id, current_active.branch_id, BranchStatus.COMPLETED
+                )
             self.ag.dag_store.update_branch_status(
-                user_id, session_id, current_active.branch_id, BranchStatus.COMPLETED
+                user_id, session_id, branch.branch_id, BranchStatus.ACTIVE
             )
-
-        # Mark target branch as active
-        self.ag.dag_store.update_branch_status(
-            user_id, session_id, branch.branch_id, BranchStatus.ACTIVE
-        )
         return True
 
     def list_branches(
@@ -207,13 +209,11 @@ class BranchTools:
         if not branch:
             return None
 
-        nodes = self.ag.get_branch_nodes(user_id, session_id, branch.branch_id)
-
         return {
             "name": branch.name,
             "status": branch.status.value,
             "intent": branch.intent,
-            "node_count": len(nodes),
+            "node_count": self.ag.count_branch_nodes(user_id, session_id, branch.branch_id),
             "tokens_used": branch.tokens_used,
             "time_elapsed_seconds": branch.time_elapsed_seconds,
             "created_at": branch.created_at,
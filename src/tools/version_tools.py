@@ -1,5 +1,5 @@
 from typing import Optional, List
-from models.dag import Checkpoint
+from ..models.dag import Checkpoint
 
 
 class VersionTools:
@@ -167,7 +167,9 @@ class VersionTools:
             checkpoint_hash_2: Second checkpoint hash
 
         Returns:
-            Dictionary with comparison details or None if checkpoints not found
+            Dictionary with comparison details (including the files added,
+            modified and deleted between the two snapshots) or None if
+            checkpoints not found
         """
         cp1 = self.get_checkpoint(checkpoint_hash_1)
         cp2 = self.get_checkpoint(checkpoint_hash_2)
@@ -175,6 +177,14 @@ class VersionTools:
         if not cp1 or not cp2:
             return None
 
+        # git compares the two snapshot trees directly
+        added, modified, deleted = [], [], []
+        ref_1, ref_2 = cp1["filesystem_ref"], cp2["filesystem_ref"]
+        if ref_1 and ref_2:
+            buckets = {"A": added, "D": deleted}
+            for status, path in self.ag.checkpoint_store.git_back.diff_commits(ref_1, ref_2):
+                buckets.get(status, modified).append(path)
+
         return {
             "checkpoint_1": checkpoint_hash_1,
             "checkpoint_2": checkpoint_hash_2,
@@ -182,6 +192,9 @@ class VersionTools:
             "time_diff_seconds": (cp2["created_at"] - cp1["created_at"]),
             "files_1": cp1["files_changed"],
             "files_2": cp2["files_changed"],
+            "added": added,
+            "modified": modified,
+            "deleted": deleted,
         }
 
     def get_latest_checkpoint(self, user_id: str, session_id: str) -> Optional[dict]:
@@ -195,12 +208,17 @@ class VersionTools:
         Returns:
             Dictionary with latest checkpoint info or None if no checkpoints
         """
-        checkpoints = self.list_checkpoints(user_id, session_id)
-        if not checkpoints:
+        # One indexed LIMIT 1 query instead of listing every checkpoint
+        node = self.ag.dag_store.get_latest_checkpoint(user_id, session_id)
+        if not node:
             return None
 
-        # Return the most recent (first in list as it's ordered by timestamp DESC)
-        return checkpoints[0]
+        return {
+            "node_id": node.id,
+            "sha": node.checkpoint_sha,
+            "label": node.content.get("label", ""),
+            "timestamp": node.timestamp,
+        }
 
     def restore_to_node(self, user_id: str, session_id: str, node_id: int) -> bool:
         """
@@ -3,21 +3,15 @@ Tracer - Subscribes to events from LangGraph callbacks and records nodes in the
 """
 
 import time
-import uuid
 from datetime import datetime
 from typing import TYPE_CHECKING
 
-from eventbus import Eventbus
-from event import Event, EventType
-from models.dag import ExecutionNode, ActionType, CallerType
+from .eventbus import Eventbus
+from .event import Event, EventType
+from .models.dag import ExecutionNode, ActionType, CallerType
 
 if TYPE_CHECKING:
-    from core import AgentGit
-
-
-def _generate_id() -> str:
-    """Generate a unique ID for nodes."""
-    return str(uuid.uuid4())[:8]
+    from .core import AgentGit
 
 
 class Tracer:
@@ -27,13 +21,15 @@ class Tracer:
         self.store = store
         self.eventbus = None  # Will be set by AgentGit
         self.current_turn = 0
-        
-    def handle_event(self, event: Event):
-        handlers = {
+        # One caller_context per turn, shared by every node recorded in it
+        # (nodes never mutate it); replaced when the turn advances.
+        self._caller_ctx = {"turn": self.current_turn}
+        # Bound handlers are created once here rather than per event. Streaming
+        # chunks are ephemeral (the final response is recorded), so have none.
+        self._handlers = {
             EventType.USER_INPUT: self._on_user_input,
             EventType.LLM_CALL_START: self._on_llm_call_start,
             EventType.LLM_CALL_END: self._on_llm_call_end,
-            EventType.LLM_STREAM_CHUNK: self._on_stream_chunk,
             EventType.LLM_STREAM_END: self._on_stream_end,
             EventType.LLM_ERROR: self._on_llm_error,
             EventType.TOOL_CALL_START: self._on_tool_call_start,
@@ -43,10 +39,18 @@ class Tracer:
             EventType.AGENT_TURN_END: self._on_turn_end,
             EventType.AGENT_THINKING: self._on_thinking,
         }
-        handler = handlers.get(event.type)
+
+    def attach(self, eventbus: Eventbus):
+        """Subscribe each handler directly to its event type, so publishing
+        calls the handler without going through handle_event."""
+        self.eventbus = eventbus
+        for event_type, handler in self._handlers.items():
+            eventbus.subscribe(event_type, handler)
+
+    def handle_event(self, event: Event):
+        handler = self._handlers.get(event.type)
         if handler: 
             handler(event)
-    
 
 
     def _on_user_input(self, event: Event):
@@ -90,10 +94,6 @@ class Tracer:
             },
         )
 
-    def _on_stream_chunk(self, event: Event):
-        """Handle streaming chunk - typically don't create nodes for each chunk."""
-        pass  # Streaming chunks are ephemeral, we record the final response
-
     def _on_stream_end(self, event: Event):
         """Handle stream end - create node with full response."""
         user_id = event.user_id or "default"
@@ -172,6 +172,7 @@ class Tracer:
 
     def _on_turn_start(self, event: Event):
         self.current_turn += 1
+        self._caller_ctx = {"turn": self.current_turn}
 
     def _on_turn_end(self, event: Event):
         user_id = event.user_id or "default"
@@ -188,28 +189,32 @@ class Tracer:
 
     def _create_node(self, user_id: str, session_id: str, action_type: ActionType, triggered_by: CallerType, content: dict) -> ExecutionNode:
         """Create node using session context from event (stateless!)."""
-        # Query DB for active branch for this session
-        branch = self.store.get_active_branch(user_id, session_id)
-        if not branch:
-            return None  # No active branch for this session
-
-        parent_id = branch.head_node_id
-
-        node = ExecutionNode(
-            user_id=user_id,
-            session_id=session_id,
-            id=_generate_id(),
-            parent_id=parent_id,
-            action_type=action_type,
-            content=content,
-            triggered_by=triggered_by,
-            caller_context={"turn": self.current_turn},
-            state_hash=None,
-            timestamp=datetime.now(),
-            duration_ms=content.get("duration_ms", 0),
-            token_count=None,
-        )
-        new_node_id = self.store.insert_node(user_id, session_id, node, branch.branch_id)
-        self.store.update_branch_head(user_id, session_id, branch.branch_id, new_node_id)
+        # One transaction (one commit per node), so the head read, node insert
+        # and head move can't interleave with another thread recording into
+        # the same branch
+        with self.store.transaction():
+            # Query DB for active branch for this session
+            branch = self.store.get_active_branch(user_id, session_id)
+            if not branch:
+                return None  # No active branch for this session
+
+            parent_id = branch.head_node_id
+
+            node = ExecutionNode(
+                user_id=user_id,
+                session_id=session_id,
+                id=0,  # assigned by the store on insert
+                parent_id=parent_id,
+                action_type=action_type,
+                content=content,
+                triggered_by=triggered_by,
+                caller_context=self._caller_ctx,
+                state_hash=None,
+                timestamp=datetime.now(),
+                duration_ms=content.get("duration_ms", 0),
+                token_count=None,
+            )
+            node.id = self.store.insert_node(user_id, session_id, node, branch.branch_id)
+            self.store.update_branch_head(user_id, session_id, branch.branch_id, node.id)
         return node
     
\ No newline at end of file
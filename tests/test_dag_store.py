@@ -0,0 +1,92 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from agentgit.models.dag import ActionType, Branch, BranchStatus, CallerType, ExecutionNode
+from agentgit.storage.dag_store import DagStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = DagStore(str(tmp_path / "dag.sqlite"))
+    yield store
+    store.close()
+
+
+def _branch(store, name="main"):
+    branch = Branch(
+        user_id="u", session_id="s", name=name, head_node_id=None, base_node_id=None,
+        status=BranchStatus.ACTIVE, intent="test", created_by=CallerType.SYSTEM,
+        created_at=datetime.now(),
+    )
+    return store.insert_branch("u", "s", branch)
+
+
+def _node(store, branch_id):
+    node = ExecutionNode(
+        user_id="u", session_id="s", id=0, parent_id=None, action_type=ActionType.USER_INPUT,
+        content={"message": "hi"}, triggered_by=CallerType.HUMAN_UI, caller_context={},
+        state_hash=None, timestamp=datetime.now(), duration_ms=0, token_count=None,
+    )
+    return store.insert_node("u", "s", node, branch_id)
+
+
+def _read_in_thread(fn):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(fn()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_nested_transaction_rolls_back_only_its_own_writes(store):
+    branch_id = _branch(store)
+    with store.transaction():
+        outer = _node(store, branch_id)
+        with pytest.raises(RuntimeError):
+            with store.transaction():
+                inner = _node(store, branch_id)
+                raise RuntimeError("inner failure")
+    assert store.get_node("u", "s", outer) is not None
+    assert store.get_node("u", "s", inner) is None
+
+
+def test_outer_rollback_clears_branch_caches(store):
+    branch_id = _branch(store)
+    assert store.get_active_branch("u", "s").head_node_id is None
+    assert store.get_branch("u", "s", "main") is not None
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.update_branch_head("u", "s", branch_id, _node(store, branch_id))
+            assert store.get_active_branch("u", "s").head_node_id is not None
+            raise RuntimeError("outer failure")
+    assert not store._active_branches
+    assert not store._branches
+    assert store.get_active_branch("u", "s").head_node_id is None
+
+
+def test_other_threads_do_not_see_uncommitted_writes(store):
+    branch_id = _branch(store)
+    with store.transaction():
+        node_id = _node(store, branch_id)
+        assert _read_in_thread(lambda: store.get_node("u", "s", node_id)) is None
+    assert _read_in_thread(lambda: store.get_node("u", "s", node_id)) is not None
+
+
+def test_transaction_sees_its_own_rows(store):
+    branch_id = _branch(store)
+    with store.transaction():
+        node_id = _node(store, branch_id)
+        assert store.get_node("u", "s", node_id).id == node_id
+        assert store.get_branch_nodes("u", "s", branch_id)[0].id == node_id
+
+
+def test_count_branch_nodes(store):
+    branch_id = _branch(store)
+    other_id = _branch(store, "other")
+    for _ in range(3):
+        _node(store, branch_id)
+    _node(store, other_id)
+    assert store.count_branch_nodes("u", "s", branch_id) == 3
+    assert store.count_branch_nodes("u", "s", other_id) == 1
@@ -0,0 +1,56 @@
+from agentgit.storage.git_backend import GitBackend
+
+
+def _snapshot(backend, workspace, files, parent=None):
+    for old in workspace.iterdir():
+        old.unlink()
+    for name, text in files.items():
+        (workspace / name).write_text(text)
+    return backend.create_commit(workspace, parent, "snapshot")
+
+
+def _setup(tmp_path):
+    backend = GitBackend(tmp_path / "snapshots.git")
+    source = tmp_path / "source"
+    source.mkdir()
+    a = _snapshot(backend, source, {"keep.txt": "a\n"})
+    b = _snapshot(backend, source, {"keep.txt": "b\n", "extra.txt": "extra\n"}, a)
+    target = tmp_path / "target"
+    target.mkdir()
+    return backend, a, b, target
+
+
+def test_restore_removes_files_the_previous_restore_wrote(tmp_path):
+    backend, a, b, target = _setup(tmp_path)
+    backend.restore_commit(b, target)
+    assert (target / "extra.txt").read_text() == "extra\n"
+    backend.restore_commit(a, target)
+    assert not (target / "extra.txt").exists()
+    assert (target / "keep.txt").read_text() == "a\n"
+
+
+def test_restore_keeps_files_edited_since_the_previous_restore(tmp_path):
+    backend, a, b, target = _setup(tmp_path)
+    backend.restore_commit(b, target)
+    (target / "extra.txt").write_text("edited\n")
+    backend.restore_commit(a, target)
+    assert (target / "extra.txt").read_text() == "edited\n"
+    assert (target / "keep.txt").read_text() == "a\n"
+
+
+def test_restore_overwrites_edited_files_the_target_contains(tmp_path):
+    backend, a, b, target = _setup(tmp_path)
+    backend.restore_commit(b, target)
+    (target / "keep.txt").write_text("edited\n")
+    backend.restore_commit(a, target)
+    assert (target / "keep.txt").read_text() == "a\n"
+
+
+def test_first_restore_keeps_untracked_files(tmp_path):
+    backend, a, b, target = _setup(tmp_path)
+    (target / "notes.txt").write_text("mine\n")
+    backend.restore_commit(a, target)
+    assert (target / "notes.txt").read_text() == "mine\n"
+    backend.restore_commit(b, target)
+    backend.restore_commit(a, target)
+    assert (target / "notes.txt").read_text() == "mine\n"
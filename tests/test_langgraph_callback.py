@@ -0,0 +1,35 @@
+from uuid import uuid4
+
+from agentgit.event import EventType
+from agentgit.eventbus import Eventbus
+from agentgit.langgraph_callback import langgraph_callback
+
+
+def _turn_end_outputs(outputs):
+    eventbus = Eventbus()
+    events = []
+    eventbus.subscribe(EventType.AGENT_TURN_END, events.append)
+    handler = langgraph_callback(eventbus)
+    run_id = uuid4()
+    handler.on_chain_start({}, {}, run_id=run_id, metadata={"user_id": "u", "session_id": "s"})
+    handler.on_chain_end(outputs, run_id=run_id)
+    assert len(events) == 1
+    assert (events[0].user_id, events[0].session_id) == ("u", "s")
+    return events[0].outputs
+
+
+def test_chain_end_stringifies_dict_outputs():
+    outputs = {"answer": 42, "steps": ["plan", "act"]}
+    data = _turn_end_outputs(outputs)
+    assert data["outputs"] == str(outputs)
+    assert "messages" not in data
+
+
+def test_chain_end_serializes_messages():
+    class Message:
+        type = "ai"
+        content = ["part"]
+
+    data = _turn_end_outputs({"messages": [Message()]})
+    assert data["messages"] == [{"type": "ai", "content": "['part']"}]
+    assert "outputs" not in data